@@ -1,13 +1,19 @@
-import sys, os, io, base64
+import sys, os, base64
+import json
+import hashlib
+import functools
+import itertools
+from email.utils import format_datetime, parsedate_to_datetime
 from pydantic import BaseModel
 from typing import Optional
+from collections import Counter
 from dotenv import load_dotenv
 
 load_dotenv()
 sys.path.append(os.path.dirname(__file__))
 
-from fastapi import FastAPI, UploadFile, File, HTTPException, Depends
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Request
+from fastapi.responses import JSONResponse, StreamingResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
 
@@ -15,11 +21,17 @@ from sqlalchemy.orm import Session
 from database import engine, get_db, Base
 from models import User, UploadedFile, Podcast, Quiz, QuizQuestion, Chat, Message
 import crud
+import jobs
+import pipeline
+from ingest import spool_upload
+from executors import run_io, run_cpu
+import executors
 from auth import create_access_token, get_current_user, get_current_user_optional
 
-from utils.extracts import extract_text
-from utils.gemini import generate_podcast_script, generate_quiz
-from audio import generate_audio_gemini as generate_audio
+from utils.extracts import extract_text, ocr_cache
+from utils.gemini import generate_podcast_script, generate_quiz, generation_cache, stream_podcast_script
+from audio import generate_audio_gemini as generate_audio, segment_cache, split_dialogue_line_by_line, submit_line_audio
+import tts_providers
 import s3_utils
 
 app = FastAPI(title="NotebookLM Backend", version="1.0.0")
@@ -39,6 +51,13 @@ app.add_middleware(
 def startup_event():
     Base.metadata.create_all(bind=engine)
     print("✅ Database tables created successfully")
+    jobs.start_workers()
+
+
+@app.on_event("shutdown")
+def shutdown_event():
+    jobs.stop_workers()
+    executors.shutdown()
 
 # ---------- MODELS ----------
 class TTSRequest(BaseModel):
@@ -62,12 +81,12 @@ class LoginRequest(BaseModel):
 async def signup(req: SignupRequest, db: Session = Depends(get_db)):
     """Create a new user account"""
     # Check if user already exists
-    existing_user = crud.get_user_by_email(db, req.email)
+    existing_user = await run_io(crud.get_user_by_email, db, req.email)
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    # Create new user
-    user = crud.create_user(db, email=req.email, password=req.password, name=req.name)
+    # Create new user (bcrypt hashing is CPU bound)
+    user = await run_cpu(crud.create_user, db, email=req.email, password=req.password, name=req.name)
     
     access_token = create_access_token(data={"sub": str(user.id)})
     
@@ -87,7 +106,7 @@ async def signup(req: SignupRequest, db: Session = Depends(get_db)):
 async def login(req: LoginRequest, db: Session = Depends(get_db)):
     """Login with email and password"""
     # Authenticate user
-    user = crud.authenticate_user(db, email=req.email, password=req.password)
+    user = await run_cpu(crud.authenticate_user, db, email=req.email, password=req.password)
     if not user:
         raise HTTPException(
             status_code=401,
@@ -95,7 +114,7 @@ async def login(req: LoginRequest, db: Session = Depends(get_db)):
         )
     
     # Update last login
-    crud.update_last_login(db, user.id)
+    await run_io(crud.update_last_login, db, user.id)
     
     access_token = create_access_token(data={"sub": str(user.id)})
     
@@ -183,96 +202,170 @@ def delete_file(file_id: int, db: Session = Depends(get_db)):
 
 
 @app.post("/upload")
-async def upload_file(file: UploadFile = File(...), 
+async def upload_file(file: UploadFile = File(...), background: bool = False,
                      current_user: Optional[User] = Depends(get_current_user_optional),
                      db: Session = Depends(get_db)):
-    """Upload a PDF or PPTX, extract text, generate podcast, and save to S3."""
+    """
+    Upload a PDF or PPTX, extract text, generate podcast, and save to S3.
+    With ?background=true the file is stored and a job id returned immediately;
+    poll GET /jobs/{job_id} for progress.
+    """
     try:
-        contents = await file.read()
-        
-        import hashlib
-        file_hash = hashlib.md5(contents).hexdigest()
-        s3_file_key = f"files/{file_hash}_{file.filename}"
-        
-        if s3_utils.file_exists(s3_file_key):
-            # File exists, check database for existing record
-            existing_file = crud.get_file_by_s3_key(db, s3_file_key)
-            if existing_file:
-                # Check if podcast exists for this file
-                existing_podcast = crud.get_existing_podcast_with_audio(db, existing_file.id, "host", 1.0)
-                
-                if existing_podcast:
-                    # Return cached file and podcast data
-                    return JSONResponse({
-                        "file_id": existing_file.id,
-                        "filename": existing_file.filename,
-                        "text_preview": existing_file.text_preview,
-                        "full_text": existing_file.extracted_text,
-                        "podcast_script": existing_podcast.script,
-                        "cached": True
-                    })
-        
-        tmp_path = f"/tmp/{file.filename}"
-        with open(tmp_path, "wb") as f:
-            f.write(contents)
-
-        # Extract text
-        text = extract_text(tmp_path)
-        if not text:
-            os.remove(tmp_path)
-            raise HTTPException(status_code=400, detail="No text extracted")
-
-        file_type = os.path.splitext(file.filename)[1].lower().replace(".", "")
-        content_type = "application/pdf" if file_type == "pdf" else "application/vnd.openxmlformats-officedocument.presentationml.presentation"
-        s3_file_url = s3_utils.upload_file(tmp_path, s3_file_key, content_type=content_type)
-
-        # Save file to database with S3 key
+        # Take over the body Starlette already buffered and hash it in place
+        spool = await spool_upload(file)
         user_id = current_user.id if current_user else None
-        db_file = crud.create_uploaded_file(
-            db=db,
-            filename=file.filename,
-            file_type=file_type,
-            file_size=len(contents),
-            extracted_text=text,
-            s3_key=s3_file_key,
-            user_id=user_id
-        )
+        # _process_upload owns the spool from here on
+        return await run_io(_process_upload, db, spool, file.filename, user_id, background)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 
-        podcast_script = generate_podcast_script(text)
+def _process_upload(db: Session, spool, filename: str, user_id: Optional[int], background: bool):
+    """Blocking part of /upload: dedup, store, then run the pipeline inline or as a job"""
+    try:
+        file_hash = spool.file_hash
         
-        try:
-            audio_stream = generate_audio(podcast_script, voice="host", speed=1.0)
-            audio_bytes = b"".join(audio_stream)
-            audio_fileobj = io.BytesIO(audio_bytes)
-            
-            # Upload podcast audio to S3
-            s3_audio_key = f"podcast_{file_hash}_host_speed1.0.mp3"
-            audio_url = s3_utils.upload_fileobj(audio_fileobj, s3_audio_key, content_type="audio/mpeg")
+        # One indexed lookup on the content hash: identical bytes are deduplicated
+        # whatever their filename, without an S3 round-trip
+        existing_file = crud.get_file_by_hash(db, file_hash)
+        if existing_file:
+            # Reuse the stored object and extracted text under a record of this user's own
+            existing_file = pipeline.claim_document(db, existing_file, filename, user_id)
+            # Check if podcast exists for this file
+            existing_podcast = crud.get_existing_podcast_with_audio(db, existing_file.id, "host", 1.0)
             
-            # Save podcast to database with audio URL
-            crud.create_podcast(
-                db=db,
-                file_id=db_file.id,
-                script=podcast_script,
-                voice_type="host",
-                speed=1.0,
-                audio_url=audio_url
+            if existing_podcast:
+                # Return cached file and podcast data
+                return JSONResponse({
+                    "file_id": existing_file.id,
+                    "filename": existing_file.filename,
+                    "text_preview": existing_file.text_preview,
+                    "full_text": existing_file.extracted_text,
+                    "podcast_script": existing_podcast.script,
+                    "cached": True
+                })
+
+            # Stored and extracted already; only the podcast is missing
+            spool.close()
+            spool = None
+            s3_file_key = existing_file.s3_key
+        else:
+            s3_file_key = f"files/{file_hash}_{filename}"
+            pipeline.store_upload(spool, s3_file_key)
+
+        if background:
+            job = jobs.enqueue(
+                db,
+                kind="upload",
+                payload={"filename": filename, "file_hash": file_hash, "s3_key": s3_file_key},
+                user_id=user_id,
+                file_id=existing_file.id if existing_file else None,
+                blob=spool
             )
+            # The job now owns the spool
+            spool = None
+            return JSONResponse({"job_id": job.id, "status": job.status}, status_code=202)
+
+        if existing_file:
+            db_file = existing_file
+        else:
+            # Extract text straight from the spooled upload
+            try:
+                db_file = pipeline.extract_document(
+                    db, spool.source(), filename, file_hash, s3_file_key, spool.size, user_id=user_id
+                )
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            finally:
+                spool.close()
+                spool = None
+
+        podcast = pipeline.create_podcast_script(db, db_file)
+        
+        try:
+            pipeline.render_podcast_audio(db, podcast, pipeline.podcast_audio_key(file_hash))
         except Exception as e:
             print(f"Failed to generate/upload podcast audio: {e}")
             # Continue without podcast audio
 
-        # Clean up temp file
-        os.remove(tmp_path)
-
         return JSONResponse({
             "file_id": db_file.id,
             "filename": db_file.filename,
             "text_preview": db_file.text_preview,
             "full_text": db_file.extracted_text,
-            "podcast_script": podcast_script,
+            "podcast_script": podcast.script,
             "cached": False
         })
+    finally:
+        if spool is not None:
+            spool.close()
+
+
+@app.get("/metrics")
+def get_metrics():
+    """Cache hit/miss counters and TTS provider health"""
+    return {
+        "caches": {
+            "generation": dict(generation_cache.stats),
+            "tts_segments": dict(segment_cache.stats),
+            "ocr": dict(ocr_cache.stats),
+        },
+        "tts_providers": tts_providers.provider_metrics(),
+    }
+
+
+@app.get("/jobs/{job_id}")
+def get_job_status(job_id: int, db: Session = Depends(get_db)):
+    """Report a background job's status and per-stage progress"""
+    job = crud.get_job(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "stage": job.stage,
+        "stages": job.stages or {},
+        "file_id": job.file_id,
+        "result": job.result,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "updated_at": job.updated_at.isoformat() if job.updated_at else None
+    }
+
+
+@app.post("/files/{file_id}/reprocess")
+def reprocess_file(file_id: int, db: Session = Depends(get_db)):
+    """Re-extract a stored file, reusing per-page results whose inputs have not changed"""
+    file = crud.get_uploaded_file(db, file_id)
+    if not file:
+        raise HTTPException(status_code=404, detail="File not found")
+    if not file.s3_key:
+        raise HTTPException(status_code=400, detail="Original file is not stored")
+
+    try:
+        contents = s3_utils.download_fileobj(file.s3_key)
+        # Rows stored before content hashes were backfilled have none
+        file_hash = file.content_hash or hashlib.md5(contents).hexdigest()
+
+        extract_stats = Counter()
+        page_store = crud.PageStore(db, file_hash)
+        text = extract_text(contents, filename=file.filename, stats=extract_stats, page_store=page_store)
+        if not text:
+            raise HTTPException(status_code=400, detail="No text extracted")
+
+        file = crud.update_uploaded_file_text(db, file_id, text)
+        return {
+            "file_id": file.id,
+            "text_preview": file.text_preview,
+            "pages_reused": extract_stats["pages_reused"],
+            "stats": dict(extract_stats)
+        }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -281,23 +374,101 @@ async def upload_file(file: UploadFile = File(...),
 @app.post("/podcast")
 async def podcast_from_text(req: TTSRequest, db: Session = Depends(get_db)):
     """Generate podcast script from text using Gemini and save to database."""
-    script = generate_podcast_script(req.text)
+    script = await run_io(generate_podcast_script, req.text)
     
     # Optionally save to database if file_id is provided
     # For now, just return the script
     return JSONResponse({"podcast_script": script})
 
 
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _script_events(lines, tts: bool = False, voice: str = "host", speed: float = 1.0, on_complete=None):
+    """
+    Server-sent events for a script as its lines arrive: a 'line' event per
+    dialogue line and, with tts, an 'audio' event (base64 MP3) per line in
+    order as soon as its synthesis finishes. Ends with a 'done' event, or an
+    'error' event if the script or its audio fails part way, in which case
+    on_complete is not called for the incomplete script.
+    """
+    script_lines = []
+    queued = []  # (index, futures) awaiting audio, in script order
+
+    def ready_audio(block: bool):
+        while queued and (block or all(f.done() for f in queued[0][1])):
+            index, futures = queued.pop(0)
+            audio = b"".join(f.result()[0] for f in futures)
+            yield _sse("audio", {"index": index, "audio": base64.b64encode(audio).decode("ascii")})
+
+    try:
+        for index, line in enumerate(lines):
+            script_lines.append(line)
+            segment = (split_dialogue_line_by_line(line) or [{"speaker": voice, "text": line}])[0]
+            yield _sse("line", {"index": index, "speaker": segment["speaker"], "text": segment["text"]})
+            if tts:
+                queued.append((index, submit_line_audio(line, speed)))
+                yield from ready_audio(block=False)
+
+        yield from ready_audio(block=True)
+    except Exception as e:
+        print(f"Error streaming podcast script: {e}")
+        for _, futures in queued:
+            for future in futures:
+                future.cancel()
+        yield _sse("error", {"detail": str(e), "lines": len(script_lines)})
+        return
+    done = {"lines": len(script_lines)}
+    if on_complete is not None and script_lines:
+        done.update(on_complete("\n".join(script_lines)) or {})
+    yield _sse("done", done)
+
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+@app.post("/podcast/stream")
+def stream_podcast_from_text(req: TTSRequest, tts: bool = False):
+    """Stream a podcast script over SSE as Gemini generates it, optionally with per-line audio"""
+    events = _script_events(stream_podcast_script(req.text), tts=tts, voice=req.voice, speed=req.speed)
+    return StreamingResponse(events, media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+@app.get("/files/{file_id}/podcast/stream")
+def stream_podcast_for_file(file_id: int, voice: str = "host", speed: float = 1.0, tts: bool = False,
+                            db: Session = Depends(get_db)):
+    """
+    Stream a file's podcast script over SSE: a saved script is replayed,
+    otherwise it is generated live and saved once complete.
+    """
+    file = crud.get_uploaded_file(db, file_id)
+    if not file:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    saved = crud.get_latest_podcast(db, file_id, voice, speed)
+    if saved is not None:
+        podcast_id = saved.id
+        lines = [line.strip() for line in saved.script.splitlines() if line.strip()]
+        on_complete = lambda script: {"podcast_id": podcast_id}
+    else:
+        lines = stream_podcast_script(file.extracted_text)
+        on_complete = lambda script: {"podcast_id": pipeline.save_streamed_script(file_id, script, voice, speed)}
+
+    events = _script_events(lines, tts=tts, voice=voice, speed=speed, on_complete=on_complete)
+    return StreamingResponse(events, media_type="text/event-stream", headers=SSE_HEADERS)
+
+
 @app.post("/files/{file_id}/podcast")
 async def create_podcast_for_file(file_id: int, voice: str = "host", speed: float = 1.0, 
                                   db: Session = Depends(get_db)):
     """Generate and save podcast for a specific file, or return existing cached version"""
     # Get file
-    file = crud.get_uploaded_file(db, file_id)
+    file = await run_io(crud.get_uploaded_file, db, file_id)
     if not file:
         raise HTTPException(status_code=404, detail="File not found")
     
-    existing_podcast = crud.get_existing_podcast_with_audio(db, file_id, voice, speed)
+    existing_podcast = await run_io(crud.get_existing_podcast_with_audio, db, file_id, voice, speed)
     if existing_podcast:
         return JSONResponse({
             "podcast_id": existing_podcast.id,
@@ -310,30 +481,13 @@ async def create_podcast_for_file(file_id: int, voice: str = "host", speed: floa
             "created_at": existing_podcast.created_at.isoformat()
         })
     
-    # Generate script
-    script = generate_podcast_script(file.extracted_text)
+    # Generate and save the script first, so it is kept even if audio fails
+    podcast = await run_io(pipeline.create_podcast_script, db, file, voice=voice, speed=speed)
     
     try:
-        audio_stream = generate_audio(script, voice=voice, speed=speed)
-        
-        # Convert iterator to bytes
-        audio_bytes = b"".join(audio_stream)
-        audio_fileobj = io.BytesIO(audio_bytes)
-        
-        # Upload to S3
         voice_label = "male_host" if voice == "host" else "female_guest"
         s3_key = f"podcast_{file_id}_{voice_label}_speed{speed}.mp3"
-        audio_url = s3_utils.upload_fileobj(audio_fileobj, s3_key, content_type="audio/mpeg")
-        
-        # Save to database with audio URL
-        podcast = crud.create_podcast(
-            db=db,
-            file_id=file_id,
-            script=script,
-            voice_type=voice,
-            speed=speed,
-            audio_url=audio_url
-        )
+        podcast = await run_io(pipeline.render_podcast_audio, db, podcast, s3_key)
         
         return JSONResponse({
             "podcast_id": podcast.id,
@@ -346,21 +500,13 @@ async def create_podcast_for_file(file_id: int, voice: str = "host", speed: floa
             "created_at": podcast.created_at.isoformat()
         })
     except Exception as e:
-        # If audio generation/upload fails, still save the script
-        podcast = crud.create_podcast(
-            db=db,
-            file_id=file_id,
-            script=script,
-            voice_type=voice,
-            speed=speed
-        )
         raise HTTPException(status_code=500, detail=f"Audio generation failed: {str(e)}")
 
 
 @app.post("/podcasts/{podcast_id}/generate-audio")
 async def generate_audio_for_podcast(podcast_id: int, db: Session = Depends(get_db)):
     """Generate and upload audio for an existing podcast script"""
-    podcast = crud.get_podcast(db, podcast_id)
+    podcast = await run_io(crud.get_podcast, db, podcast_id)
     if not podcast:
         raise HTTPException(status_code=404, detail="Podcast not found")
     
@@ -373,20 +519,10 @@ async def generate_audio_for_podcast(podcast_id: int, db: Session = Depends(get_
         })
     
     try:
-        # Generate audio from script
-        audio_stream = generate_audio(podcast.script, voice=podcast.voice_type, speed=podcast.speed)
-        
-        # Convert stream to bytes
-        audio_bytes = b"".join(audio_stream)
-        audio_fileobj = io.BytesIO(audio_bytes)
-        
-        # Upload to S3
+        # Generate audio from script, upload to S3 and record the URL
         voice_label = "male_host" if podcast.voice_type == "host" else "female_guest"
         s3_key = f"podcast_{podcast.file_id}_{voice_label}_speed{podcast.speed}_{podcast.id}.mp3"
-        audio_url = s3_utils.upload_fileobj(audio_fileobj, s3_key, content_type="audio/mpeg")
-        
-        # Update podcast with audio URL
-        podcast = crud.update_podcast_audio_url(db, podcast_id, audio_url)
+        podcast = await run_io(pipeline.render_podcast_audio, db, podcast, s3_key)
         
         return JSONResponse({
             "podcast_id": podcast.id,
@@ -397,6 +533,118 @@ async def generate_audio_for_podcast(podcast_id: int, db: Session = Depends(get_
         raise HTTPException(status_code=500, detail=f"Audio generation failed: {str(e)}")
 
 
+AUDIO_CHUNK_SIZE = 64 * 1024
+
+
+# _parse_range result for a well-formed range that starts past the end of the object
+RANGE_NOT_SATISFIABLE = "unsatisfiable"
+
+
+def _parse_range(header: str, size: int):
+    """
+    Parse a single 'bytes=' range into inclusive (start, end).
+    Returns None for headers to ignore (other units, malformed or multiple
+    ranges; RFC 9110 serves the full body for those) and RANGE_NOT_SATISFIABLE
+    when a well-formed range starts at or past the end of the object.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None
+    first, dash, last = spec.strip().partition("-")
+    if not dash or not (first.isdigit() or first == "") or not (last.isdigit() or last == ""):
+        return None
+    if first:
+        start = int(first)
+        if last and int(last) < start:
+            return None
+        if start >= size:
+            return RANGE_NOT_SATISFIABLE
+        return start, min(int(last), size - 1) if last else size - 1
+    if not last:
+        return None
+    # Suffix range: the last N bytes
+    if int(last) == 0 or size == 0:
+        return RANGE_NOT_SATISFIABLE
+    return max(size - int(last), 0), size - 1
+
+
+def _not_modified(request: Request, etag: str, last_modified) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return last_modified.replace(microsecond=0) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _stream_body(body):
+    try:
+        for chunk in body.iter_chunks(chunk_size=AUDIO_CHUNK_SIZE):
+            yield chunk
+    finally:
+        body.close()
+
+
+async def _prime_stream(chunks):
+    """
+    Pull the first chunk before any headers are sent, so a synthesis that fails
+    outright raises here (and becomes a 500) instead of ending an empty 200
+    """
+    first = await run_io(next, chunks, None)
+    return itertools.chain([first], chunks) if first is not None else iter(())
+
+
+@app.api_route("/podcasts/{podcast_id}/audio", methods=["GET", "HEAD"])
+def serve_podcast_audio(podcast_id: int, request: Request, db: Session = Depends(get_db)):
+    """
+    Serve a podcast's stored audio with byte ranges, ETag/Last-Modified and 304s.
+    Ranges are streamed from S3 without buffering the object.
+    """
+    podcast = crud.get_podcast(db, podcast_id)
+    if not podcast or not podcast.audio_url:
+        raise HTTPException(status_code=404, detail="Podcast audio not found")
+
+    s3_key = podcast.audio_url.split('/')[-1]
+    meta = s3_utils.head_object(s3_key)
+    if meta is None:
+        raise HTTPException(status_code=404, detail="Podcast audio not found")
+
+    size = meta["size"]
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": meta["etag"],
+        "Last-Modified": format_datetime(meta["last_modified"], usegmt=True),
+        "Cache-Control": "private, max-age=3600",
+    }
+    if _not_modified(request, meta["etag"], meta["last_modified"]):
+        return Response(status_code=304, headers=headers)
+
+    start, end, status_code = 0, size - 1, 200
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    # A stale If-Range validator means the client gets the whole new object
+    if range_header and (if_range is None or if_range == meta["etag"] or if_range == headers["Last-Modified"]):
+        byte_range = _parse_range(range_header, size)
+        if byte_range == RANGE_NOT_SATISFIABLE:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+        if byte_range is not None:
+            start, end = byte_range
+            status_code = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    headers["Content-Length"] = str(end - start + 1)
+    media_type = meta["content_type"] or "audio/mpeg"
+    if request.method == "HEAD" or size == 0:
+        return Response(status_code=status_code, headers=headers, media_type=media_type)
+
+    body = s3_utils.get_object_stream(s3_key, start, end) if status_code == 206 else s3_utils.get_object_stream(s3_key)
+    return StreamingResponse(_stream_body(body), status_code=status_code, headers=headers, media_type=media_type)
+
+
 @app.get("/files/{file_id}/podcasts")
 def get_file_podcasts(file_id: int, db: Session = Depends(get_db)):
     """Get all podcasts for a file"""
@@ -421,7 +669,7 @@ async def generate_quiz_endpoint(req: dict, db: Session = Depends(get_db)):
     try:
         text = req.get("text")
         count = int(req.get("count", 5))
-        quiz_questions = generate_quiz(text, count)
+        quiz_questions = await run_io(generate_quiz, text, count)
         return JSONResponse({"success": True, "quiz": quiz_questions})
     except Exception as e:
         return JSONResponse({"success": False, "error": str(e)}, status_code=500)
@@ -431,22 +679,23 @@ async def generate_quiz_endpoint(req: dict, db: Session = Depends(get_db)):
 async def create_quiz_for_file(file_id: int, count: int = 5, db: Session = Depends(get_db)):
     """Generate and save quiz for a specific file"""
     # Get file
-    file = crud.get_uploaded_file(db, file_id)
+    file = await run_io(crud.get_uploaded_file, db, file_id)
     if not file:
         raise HTTPException(status_code=404, detail="File not found")
     
     # Generate quiz
-    quiz_questions = generate_quiz(file.extracted_text, count)
+    quiz_questions = await run_io(generate_quiz, file.extracted_text, count)
     
     # Save to database
-    quiz = crud.create_quiz_with_questions(
+    quiz = await run_io(
+        crud.create_quiz_with_questions,
         db=db,
         file_id=file_id,
         questions_data=quiz_questions
     )
     
     # Get questions
-    questions = crud.get_quiz_questions(db, quiz.id)
+    questions = await run_io(crud.get_quiz_questions, db, quiz.id)
     
     return JSONResponse({
         "quiz_id": quiz.id,
@@ -496,7 +745,7 @@ def get_file_quizzes(file_id: int, db: Session = Depends(get_db)):
 @app.post("/quiz")
 async def quiz_from_text(req: TTSRequest):
     """Generate quiz questions from text (legacy endpoint)"""
-    quiz = generate_quiz(req.text)
+    quiz = await run_io(generate_quiz, req.text)
     return JSONResponse({"quiz": quiz})
 
 
@@ -520,59 +769,38 @@ async def generate_audio_endpoint(req: TTSRequest, db: Session = Depends(get_db)
                     pass
         
         if file_id:
-            existing_podcast = crud.get_existing_podcast_with_audio(db, file_id, req.voice, req.speed)
+            existing_podcast = await run_io(crud.get_existing_podcast_with_audio, db, file_id, req.voice, req.speed)
             if existing_podcast and existing_podcast.audio_url:
                 try:
                     # Extract S3 key from URL
                     s3_key = existing_podcast.audio_url.split('/')[-1]
-                    audio_data = s3_utils.download_fileobj(s3_key)
+                    body = await run_io(s3_utils.get_object_stream, s3_key)
+                    # Stream from S3 rather than buffering the whole MP3;
+                    # players that seek should use /podcasts/{id}/audio
                     return StreamingResponse(
-                        io.BytesIO(audio_data),
+                        _stream_body(body),
                         media_type="audio/mpeg",
                         headers={"Content-Disposition": f"inline; filename=podcast_cached.mp3"}
                     )
                 except Exception as e:
                     print(f"Failed to stream from S3: {e}, regenerating...")
         
-        audio_stream = generate_audio(actual_text, voice=req.voice, speed=req.speed)
+        # Segments stream to the client as they are synthesized, in script order
+        audio_stream = await _prime_stream(generate_audio(actual_text, voice=req.voice, speed=req.speed))
+        voice_label = "male_host" if req.voice == "host" else "female_guest"
         
         if file_id:
-            try:
-                # Convert stream to bytes
-                audio_bytes = b"".join(audio_stream)
-                
-                # Create TWO separate BytesIO objects to avoid closure issues
-                audio_for_s3 = io.BytesIO(audio_bytes)
-                audio_for_response = io.BytesIO(audio_bytes)
-                
-                # Upload to S3 (this may close audio_for_s3)
-                voice_label = "male_host" if req.voice == "host" else "female_guest"
-                s3_key = f"podcast_{file_id}_{voice_label}_speed{req.speed}.mp3"
-                audio_url = s3_utils.upload_fileobj(audio_for_s3, s3_key, content_type="audio/mpeg")
-                
-                # Save to database
-                crud.create_podcast(
-                    db=db,
-                    file_id=file_id,
-                    script=actual_text[:1000],
-                    voice_type=req.voice,
-                    speed=req.speed,
-                    audio_url=audio_url
-                )
-                
-                # Return the separate BytesIO object for response
-                return StreamingResponse(
-                    audio_for_response,
-                    media_type="audio/mpeg",
-                    headers={"Content-Disposition": f"inline; filename=podcast_{voice_label}.mp3"}
+            # Tee the stream into S3 and record the podcast once it has completed
+            s3_key = f"podcast_{file_id}_{voice_label}_speed{req.speed}.mp3"
+            audio_stream = pipeline.tee_to_s3(
+                audio_stream,
+                s3_key,
+                on_uploaded=functools.partial(
+                    pipeline.record_streamed_podcast, file_id, actual_text[:1000], req.voice, req.speed
                 )
-            except Exception as e:
-                print(f"Failed to cache audio: {e}, returning generated audio anyway")
-                # If caching fails, regenerate and return without caching
-                audio_stream = generate_audio(actual_text, voice=req.voice, speed=req.speed)
+            )
         
-        # Return streaming audio (no caching)
-        voice_label = "male_host" if req.voice == "host" else "female_guest"
+        # Return streaming audio
         filename = f"podcast_{voice_label}.mp3"
         
         return StreamingResponse(
@@ -585,26 +813,26 @@ async def generate_audio_endpoint(req: TTSRequest, db: Session = Depends(get_db)
 
 
 @app.post("/audio/normal")
-async def audio_normal(req: TTSRequest):
+async def audio_normal(req: TTSRequest, db: Session = Depends(get_db)):
     req.speed = 1.0
-    return await generate_audio_endpoint(req)
+    return await generate_audio_endpoint(req, db)
 
 
 @app.post("/audio/fast")
-async def audio_fast(req: TTSRequest):
+async def audio_fast(req: TTSRequest, db: Session = Depends(get_db)):
     req.speed = 1.25
-    return await generate_audio_endpoint(req)
+    return await generate_audio_endpoint(req, db)
 
 
 @app.post("/audio/slow")
-async def audio_slow(req: TTSRequest):
+async def audio_slow(req: TTSRequest, db: Session = Depends(get_db)):
     req.speed = 0.8
-    return await generate_audio_endpoint(req)
+    return await generate_audio_endpoint(req, db)
 
 
 # ----- CHATS -----
 @app.get("/chats")
-async def get_user_chats_endpoint(current_user: User = Depends(get_current_user), 
+def get_user_chats_endpoint(current_user: User = Depends(get_current_user), 
                                   db: Session = Depends(get_db)):
     """Get all chats for the current user"""
     chats = crud.get_user_chats(db, current_user.id)
@@ -622,7 +850,7 @@ async def get_user_chats_endpoint(current_user: User = Depends(get_current_user)
 
 
 @app.get("/chats/{chat_id}")
-async def get_chat_endpoint(chat_id: int, current_user: User = Depends(get_current_user),
+def get_chat_endpoint(chat_id: int, current_user: User = Depends(get_current_user),
                             db: Session = Depends(get_db)):
     """Get specific chat with all messages"""
     chat = crud.get_chat(db, chat_id)
@@ -657,7 +885,7 @@ async def get_chat_endpoint(chat_id: int, current_user: User = Depends(get_curre
 
 
 @app.post("/chats")
-async def create_chat_endpoint(req: dict = None,
+def create_chat_endpoint(req: dict = None,
                                current_user: User = Depends(get_current_user),
                                db: Session = Depends(get_db)):
     """Create a new chat"""
@@ -679,7 +907,7 @@ async def create_chat_endpoint(req: dict = None,
 
 
 @app.post("/chats/{chat_id}/messages")
-async def add_message_endpoint(chat_id: int, req: dict, 
+def add_message_endpoint(chat_id: int, req: dict, 
                                current_user: User = Depends(get_current_user),
                                db: Session = Depends(get_db)):
     """Add a message to a chat"""
@@ -710,7 +938,7 @@ async def add_message_endpoint(chat_id: int, req: dict,
 
 
 @app.delete("/chats/{chat_id}")
-async def delete_chat_endpoint(chat_id: int, current_user: User = Depends(get_current_user),
+def delete_chat_endpoint(chat_id: int, current_user: User = Depends(get_current_user),
                                db: Session = Depends(get_db)):
     """Delete a chat"""
     chat = crud.get_chat(db, chat_id)
@@ -1,43 +1,215 @@
 import os
-from typing import Iterator
-import requests
+import time
+import hashlib
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterator, List, Optional, Tuple
 import re
 
+from utils.cache import LRUCache, DiskCache, TieredCache
+from utils import timestretch
+import tts_providers
+
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
 if not GEMINI_API_KEY:
     raise RuntimeError("GEMINI_API_KEY must be set")
 
-def generate_audio_gemini(text: str, voice: str = "host", speed: float = 1.0) -> Iterator[bytes]:
+# TTS_WORKERS: segments synthesized concurrently across all scripts
+# (per-provider limits live in tts_providers)
+TTS_WORKERS = int(os.getenv("TTS_WORKERS", "8"))
+
+# TTS_CACHE_SIZE: synthesized segments kept in memory per process
+# TTS_CACHE_DIR: optional directory for a shared on-disk tier, capped at TTS_CACHE_MAX_BYTES
+TTS_CACHE_SIZE = int(os.getenv("TTS_CACHE_SIZE", "512"))
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR")
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+# Providers in the order they are tried
+PROVIDERS = tuple(tts_providers.providers)
+
+segment_cache = TieredCache(
+    LRUCache(TTS_CACHE_SIZE),
+    DiskCache(TTS_CACHE_DIR, max_bytes=TTS_CACHE_MAX_BYTES) if TTS_CACHE_DIR else None
+)
+
+_tts_pool = ThreadPoolExecutor(max_workers=TTS_WORKERS, thread_name_prefix="tts")
+
+
+def generate_audio_gemini(text: str, voice: str = "host", speed: float = 1.0,
+                          stats: Optional[Counter] = None) -> Iterator[bytes]:
     """
     Generate audio line by line.
     If line starts with 'Host:' → Host voice
     If line starts with 'Guest:' → Guest voice
-    Keeps exact order of the script.
+    Consecutive lines of one speaker are merged into as few provider requests
+    as possible. Speeds other than 1.0 are time-stretched locally from the
+    1.0x segments, so a new speed costs no provider calls for cached lines.
+    Segments are synthesized concurrently; each one's MP3 frames are yielded
+    as soon as it and every earlier segment are ready, in exact script order.
     """
-    try:
-        # Split into dialogue segments (preserve order)
-        segments = split_dialogue_line_by_line(text)
-
-        if not segments:
-            raise RuntimeError("No dialogue segments found")
+    # Split into dialogue segments (preserve order)
+    lines = split_dialogue_line_by_line(text)
 
-        audio_segments = []
-        for seg in segments:
-            audio_data = generate_single_voice_audio_fast(seg, speed)
-            if audio_data:
-                audio_segments.append(audio_data)
+    if not lines:
+        raise RuntimeError("Audio generation failed: No dialogue segments found")
 
-        if not audio_segments:
-            raise RuntimeError("No audio generated")
+    segments = plan_segments(lines)
+    if stats is not None:
+        stats["lines"] += len(lines)
+        stats["requests_planned"] += len(segments)
+    print(f"TTS plan: {len(lines)} line(s) -> {len(segments)} request(s)")
 
-        combined_audio = b"".join(audio_segments)
+    return _stream_audio(segments, speed, stats)
 
-        return iter([combined_audio])
 
+def _stream_audio(segments: List[dict], speed: float, stats: Optional[Counter]) -> Iterator[bytes]:
+    produced = False
+    try:
+        for audio in iter_segment_audio(segments, speed, stats):
+            if audio:
+                produced = True
+                yield audio
     except Exception as e:
         raise RuntimeError(f"Audio generation failed: {str(e)}")
 
+    if not produced:
+        raise RuntimeError("Audio generation failed: No audio generated")
+
+
+def iter_segment_audio(segments: List[dict], speed: float, stats: Optional[Counter] = None) -> Iterator[bytes]:
+    """
+    Synthesize segments on the TTS pool and yield their audio in script order
+    (b"" for segments every provider failed on). Segments are looked up in the
+    segment cache first and repeated lines are synthesized once. Per-segment
+    latency and failures are logged and summarised into stats.
+    """
+    stats = stats if stats is not None else Counter()
+    started = time.perf_counter()
+    stats["segments"] += len(segments)
+
+    cached = {}
+    pending = {}
+    for index, seg in enumerate(segments):
+        audio = cached_segment_audio(seg, speed)
+        if audio is not None:
+            cached[index] = audio
+            stats["segments_cached"] += 1
+            continue
+        identity = (seg["voice"], seg["text"])
+        if identity in pending:
+            stats["segments_repeated"] += 1
+        else:
+            pending[identity] = _tts_pool.submit(_synthesize_timed, seg, speed)
+
+    latencies = []
+    collected = {}
+    try:
+        for index, seg in enumerate(segments):
+            if index in cached:
+                yield cached[index]
+                continue
+
+            identity = (seg["voice"], seg["text"])
+            if identity in collected:
+                yield collected[identity]
+                continue
+
+            audio, provider, seconds = pending[identity].result()
+            collected[identity] = audio
+            latencies.append(seconds)
+            stats["segments_synthesized"] += 1
+            stats["segment_seconds"] += seconds
+            if audio:
+                stats[f"segments_{provider}"] += 1
+            else:
+                stats["segments_failed"] += 1
+                print(f"TTS segment {index} failed after {seconds:.2f}s: {seg['text'][:60]!r}")
+            yield audio
+    finally:
+        # A closed stream (client gone) must not leave queued provider calls behind
+        for future in pending.values():
+            future.cancel()
+        stats["synthesis_seconds"] += time.perf_counter() - started
+        if latencies:
+            latencies.sort()
+            stats["segment_p50_seconds"] = latencies[len(latencies) // 2]
+            stats["segment_max_seconds"] = latencies[-1]
+        print(f"TTS stats: {dict(stats)}")
+        print(f"TTS provider metrics: {tts_providers.provider_metrics()}")
+
+
+def submit_line_audio(line: str, speed: float = 1.0) -> List[Future]:
+    """
+    Queue TTS for one script line as soon as it is complete (used while the
+    script itself is still streaming). Each future resolves to
+    (audio, provider, seconds); join their audio in order.
+    """
+    segments = plan_segments(split_dialogue_line_by_line(line))
+    return [_tts_pool.submit(_synthesize_timed, seg, speed) for seg in segments]
+
+
+def segment_cache_key(voice: str, speed: float, provider: str, text: str) -> str:
+    payload = "\x00".join([voice, repr(float(speed)), provider, text])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# Pseudo-provider naming stretched speed variants in the segment cache
+STRETCH_PROVIDER = "timestretch"
+
+
+def stretches_locally(speed: float) -> bool:
+    """Non-1.0 speeds are derived from the 1.0x rendering when ffmpeg is available"""
+    return speed != 1.0 and timestretch.available()
+
+
+def cached_segment_audio(segment: dict, speed: float) -> Optional[bytes]:
+    """Cached audio for a segment from any provider, in provider preference order"""
+    if stretches_locally(speed):
+        return segment_cache.get(segment_cache_key(segment["voice"], speed, STRETCH_PROVIDER, segment["text"]))
+    for provider in PROVIDERS:
+        audio = segment_cache.get(segment_cache_key(segment["voice"], speed, provider, segment["text"]))
+        if audio is not None:
+            return audio
+    return None
+
+
+def _segment_audio(segment: dict, speed: float) -> Tuple[bytes, Optional[str]]:
+    """
+    Audio for a segment at speed, from the cache or a provider. Speed variants
+    are time-stretched from the (cached) 1.0x rendering and cached per speed.
+    """
+    if stretches_locally(speed):
+        key = segment_cache_key(segment["voice"], speed, STRETCH_PROVIDER, segment["text"])
+        audio = segment_cache.get(key)
+        if audio is not None:
+            return audio, STRETCH_PROVIDER
+        base, provider = _segment_audio(segment, 1.0)
+        if not base:
+            return b"", None
+        try:
+            audio = timestretch.time_stretch(base, speed)
+        except Exception as e:
+            print(f"Time-stretch to {speed}x failed, using provider speed: {e}")
+        else:
+            segment_cache.set(key, audio)
+            return audio, provider
+
+    audio = cached_segment_audio(segment, speed)
+    if audio is not None:
+        return audio, "cache"
+    audio, provider = _synthesize_segment(segment, speed)
+    if audio:
+        segment_cache.set(segment_cache_key(segment["voice"], speed, provider, segment["text"]), audio)
+    return audio, provider
+
+
+def _synthesize_timed(segment: dict, speed: float) -> Tuple[bytes, Optional[str], float]:
+    started = time.perf_counter()
+    audio, provider = _segment_audio(segment, speed)
+    return audio, provider, time.perf_counter() - started
+
+
 def split_dialogue_line_by_line(text: str) -> list:
     """Split strictly line by line with Host/Guest detection"""
     segments = []
@@ -61,43 +233,63 @@ def split_dialogue_line_by_line(text: str) -> list:
 
     return segments
 
-def generate_single_voice_audio_fast(segment: dict, speed: float) -> bytes:
-    """Generate audio for one segment (Host=Brian, Guest=Amy)"""
-    try:
-        text = segment["text"]
-        voice_type = segment["voice"]
+def plan_segments(segments: List[dict], max_chars: Optional[int] = None) -> List[dict]:
+    """
+    Merge consecutive same-speaker segments into chunks of at most max_chars
+    (default: the smallest provider limit) and split longer lines at sentence
+    boundaries, falling back to word boundaries for overlong sentences.
+    """
+    max_chars = max_chars or tts_providers.max_request_chars()
+    planned = []
 
-        if voice_type == "host":
-            voice_name = "Brian"  # Male
-        else:
-            voice_name = "Amy"    # Female
+    for seg in segments:
+        for piece in _split_text(seg["text"], max_chars):
+            last = planned[-1] if planned else None
+            if last is not None and last["voice"] == seg["voice"]:
+                merged = f"{_terminate(last['text'])} {piece}"
+                if len(merged) <= max_chars:
+                    last["text"] = merged
+                    continue
+            planned.append({"speaker": seg["speaker"], "text": piece, "voice": seg["voice"]})
 
-        # --- Primary API: StreamElements ---
-        url = "https://api.streamelements.com/kappa/v2/speech"
-        params = {"voice": voice_name, "text": text}
-        response = requests.get(url, params=params, timeout=15)
+    return planned
 
-        if response.status_code == 200 and len(response.content) > 100:
-            return response.content
 
-        # --- Fallback: ResponsiveVoice ---
-        fallback_url = "https://responsivevoice.org/responsivevoice/getvoice.php"
-        voice_mapping = {"Brian": "UK English Male", "Amy": "US English Female"}
-        fallback_params = {
-            "t": text,
-            "tl": "en",
-            "sv": voice_mapping[voice_name],
-            "pitch": 0.5,
-            "rate": speed,
-            "vol": 1,
-        }
+def _terminate(text: str) -> str:
+    # Keep a sentence break between merged lines so the pause is not lost
+    return text if text[-1] in ".!?;:…\"'" else f"{text}."
 
-        fallback_response = requests.get(fallback_url, params=fallback_params, timeout=15)
 
-        if fallback_response.status_code == 200 and len(fallback_response.content) > 100:
-            return fallback_response.content
+def _split_text(text: str, max_chars: int) -> List[str]:
+    if len(text) <= max_chars:
+        return [text]
 
-        return b""
+    pieces = []
+    current = ""
+    for sentence in re.split(r"(?<=[.!?…])\s+", text):
+        words = [sentence] if len(sentence) <= max_chars else sentence.split()
+        for word in words:
+            candidate = f"{current} {word}" if current else word
+            if len(candidate) <= max_chars:
+                current = candidate
+                continue
+            if current:
+                pieces.append(current)
+            # A single word longer than the limit is hard-split
+            while len(word) > max_chars:
+                pieces.append(word[:max_chars])
+                word = word[max_chars:]
+            current = word
+    if current:
+        pieces.append(current)
+    return pieces
 
-    except Exception as e:
-        return b""
+
+def generate_single_voice_audio_fast(segment: dict, speed: float) -> bytes:
+    """Generate audio for one segment (Host=Brian, Guest=Amy)"""
+    return _synthesize_segment(segment, speed)[0]
+
+
+def _synthesize_segment(segment: dict, speed: float) -> Tuple[bytes, Optional[str]]:
+    """Audio for one segment and the provider that produced it, routed across healthy providers"""
+    return tts_providers.router.synthesize(segment["text"], segment["voice"], speed)
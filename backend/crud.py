@@ -1,5 +1,5 @@
 from sqlalchemy.orm import Session
-from models import User, UploadedFile, Podcast, Quiz, QuizQuestion, UserSession, Chat, Message
+from models import User, UploadedFile, ExtractedPage, Podcast, Quiz, QuizQuestion, UserSession, Chat, Message, Job
 from typing import List, Optional
 import json
 import hashlib
@@ -72,7 +72,8 @@ def update_last_login(db: Session, user_id: int):
 # ========== UPLOADED FILES ==========
 
 def create_uploaded_file(db: Session, filename: str, file_type: str, file_size: int, 
-                         extracted_text: str, s3_key: Optional[str] = None, user_id: Optional[int] = None):
+                         extracted_text: str, s3_key: Optional[str] = None, user_id: Optional[int] = None,
+                         content_hash: Optional[str] = None):
     """Create a new uploaded file record"""
     text_preview = extracted_text[:1000] if extracted_text else ""
     
@@ -81,6 +82,7 @@ def create_uploaded_file(db: Session, filename: str, file_type: str, file_size:
         file_type=file_type,
         file_size=file_size,
         s3_key=s3_key,
+        content_hash=content_hash,
         extracted_text=extracted_text,
         text_preview=text_preview,
         user_id=user_id
@@ -112,8 +114,16 @@ def delete_uploaded_file(db: Session, file_id: int):
 
 
 def get_file_by_hash(db: Session, file_hash: str):
-    """Get uploaded file by content hash"""
-    return db.query(UploadedFile).filter(UploadedFile.s3_key.contains(file_hash)).first()
+    """Get uploaded file by content hash (indexed lookup)"""
+    return db.query(UploadedFile).filter(UploadedFile.content_hash == file_hash).order_by(UploadedFile.id).first()
+
+
+def get_user_file_by_hash(db: Session, file_hash: str, user_id: Optional[int]):
+    """Get a user's own uploaded file by content hash (user_id None means anonymous uploads)"""
+    owner = UploadedFile.user_id.is_(None) if user_id is None else UploadedFile.user_id == user_id
+    return db.query(UploadedFile).filter(
+        UploadedFile.content_hash == file_hash, owner
+    ).order_by(UploadedFile.id).first()
 
 
 def get_file_by_s3_key(db: Session, s3_key: str):
@@ -121,6 +131,79 @@ def get_file_by_s3_key(db: Session, s3_key: str):
     return db.query(UploadedFile).filter(UploadedFile.s3_key == s3_key).first()
 
 
+def update_uploaded_file_text(db: Session, file_id: int, extracted_text: str):
+    """Replace the extracted text of an uploaded file"""
+    db_file = get_uploaded_file(db, file_id)
+    if db_file:
+        db_file.extracted_text = extracted_text
+        db_file.text_preview = extracted_text[:1000] if extracted_text else ""
+        db.commit()
+        db.refresh(db_file)
+    return db_file
+
+
+# ========== EXTRACTED PAGES ==========
+
+def create_extracted_page(db: Session, document_hash: str, page_number: int, source: str,
+                          text: str, content_hash: str):
+    """Save the extraction result for one page"""
+    db_page = ExtractedPage(
+        document_hash=document_hash,
+        page_number=page_number,
+        source=source,
+        text=text,
+        content_hash=content_hash
+    )
+    db.add(db_page)
+    db.commit()
+    return db_page
+
+
+def get_extracted_page_texts(db: Session, content_hashes: List[str], source: str = "ocr") -> dict:
+    """Map content hash -> stored text for pages extracted before with the same inputs"""
+    if not content_hashes:
+        return {}
+    pages = db.query(ExtractedPage.content_hash, ExtractedPage.text).filter(
+        ExtractedPage.content_hash.in_(content_hashes),
+        ExtractedPage.source == source
+    ).all()
+    return {page.content_hash: page.text or "" for page in pages}
+
+
+def get_extracted_pages(db: Session, document_hash: str):
+    """Get all stored page results for a document, in page order"""
+    return db.query(ExtractedPage).filter(
+        ExtractedPage.document_hash == document_hash
+    ).order_by(ExtractedPage.page_number, ExtractedPage.source).all()
+
+
+class PageStore:
+    """Page results store for utils.extracts, backed by the extracted_pages table"""
+
+    def __init__(self, db: Session, document_hash: str):
+        self.db = db
+        self.document_hash = document_hash
+        # Rows already written for this document, so re-processing does not duplicate them
+        self._saved = {
+            (page.page_number, page.source, page.content_hash)
+            for page in get_extracted_pages(db, document_hash)
+        }
+
+    def lookup(self, content_hashes: List[str]) -> dict:
+        return get_extracted_page_texts(self.db, content_hashes)
+
+    def save(self, page_number: int, source: str, text: str, content_hash: str):
+        if (page_number, source, content_hash) in self._saved:
+            return
+        self._saved.add((page_number, source, content_hash))
+        try:
+            create_extracted_page(self.db, self.document_hash, page_number, source, text, content_hash)
+        except Exception as e:
+            # Page results are an optimisation; never fail the extraction over them
+            self.db.rollback()
+            print(f"Failed to save page {page_number} ({source}): {e}")
+
+
 # ========== PODCASTS ==========
 
 def create_podcast(db: Session, file_id: int, script: str, voice_type: str = "host", 
@@ -149,6 +232,15 @@ def get_existing_podcast_with_audio(db: Session, file_id: int, voice_type: str =
     ).first()
 
 
+def get_latest_podcast(db: Session, file_id: int, voice_type: str = "host", speed: float = 1.0):
+    """Get the podcast for a file with matching voice and speed, preferring one with audio"""
+    return db.query(Podcast).filter(
+        Podcast.file_id == file_id,
+        Podcast.voice_type == voice_type,
+        Podcast.speed == speed
+    ).order_by(Podcast.audio_url.is_(None), Podcast.id.desc()).first()
+
+
 def get_podcast(db: Session, podcast_id: int):
     """Get podcast by ID"""
     return db.query(Podcast).filter(Podcast.id == podcast_id).first()
@@ -278,6 +370,95 @@ def delete_chat(db: Session, chat_id: int):
     return False
 
 
+# ========== JOBS ==========
+
+def create_job(db: Session, kind: str, payload: dict, user_id: Optional[int] = None,
+               file_id: Optional[int] = None, commit: bool = True):
+    """Create a queued background job (with commit=False it is only flushed, so it has an id)"""
+    db_job = Job(kind=kind, status="queued", payload=payload, stages={}, user_id=user_id, file_id=file_id)
+    db.add(db_job)
+    if not commit:
+        db.flush()
+        return db_job
+    db.commit()
+    db.refresh(db_job)
+    return db_job
+
+
+def get_job_statuses(db: Session, job_ids: List[int]) -> dict:
+    """Map job ids to their current status"""
+    if not job_ids:
+        return {}
+    return dict(db.query(Job.id, Job.status).filter(Job.id.in_(job_ids)).all())
+
+
+def get_job(db: Session, job_id: int):
+    """Get job by ID"""
+    return db.query(Job).filter(Job.id == job_id).first()
+
+
+def claim_next_job(db: Session, kinds: List[str]):
+    """Atomically move the oldest queued job to running and return it, or None"""
+    candidates = db.query(Job.id).filter(
+        Job.status == "queued",
+        Job.kind.in_(kinds)
+    ).order_by(Job.id).limit(10).all()
+
+    for (job_id,) in candidates:
+        # Conditional update so two workers can never claim the same job
+        claimed = db.query(Job).filter(Job.id == job_id, Job.status == "queued").update(
+            {Job.status: "running"}, synchronize_session=False
+        )
+        db.commit()
+        if claimed:
+            return get_job(db, job_id)
+    return None
+
+
+def update_job(db: Session, job_id: int, **fields):
+    """Update arbitrary job columns"""
+    job = get_job(db, job_id)
+    if job:
+        for key, value in fields.items():
+            setattr(job, key, value)
+        db.commit()
+        db.refresh(job)
+    return job
+
+
+def update_job_stage(db: Session, job_id: int, stage: str, info: dict):
+    """Merge progress info for one stage into the job's stages map"""
+    job = get_job(db, job_id)
+    if job:
+        stages = dict(job.stages or {})
+        stages[stage] = {**stages.get(stage, {}), **info}
+        job.stages = stages  # reassign so the JSON column is flagged dirty
+        job.stage = stage
+        db.commit()
+        db.refresh(job)
+    return job
+
+
+def finish_job(db: Session, job_id: int, status: str, result: Optional[dict] = None,
+               error: Optional[str] = None):
+    """Mark a job succeeded or failed"""
+    fields = {"status": status, "error": error}
+    if result is not None:
+        fields["result"] = result
+    return update_job(db, job_id, **fields)
+
+
+def requeue_stale_jobs(db: Session, stale_after_seconds: int) -> int:
+    """Put running jobs that have made no progress for stale_after_seconds back on the queue"""
+    from datetime import datetime, timedelta, timezone
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=stale_after_seconds)
+    count = db.query(Job).filter(Job.status == "running", Job.updated_at < cutoff).update(
+        {Job.status: "queued"}, synchronize_session=False
+    )
+    db.commit()
+    return count
+
+
 # ========== MESSAGES ==========
 
 def create_message(db: Session, chat_id: int, role: str, content: Optional[str] = None, 
@@ -12,9 +12,13 @@ DATABASE_URL = os.getenv(
     f"postgresql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT', '5432')}/{os.getenv('DB_NAME')}"
 )
 
+# SQLite (local runs) needs connections shareable across worker threads
+connect_args = {"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
+
 # Create SQLAlchemy engine
 engine = create_engine(
     DATABASE_URL,
+    connect_args=connect_args,
     pool_pre_ping=True,  # Verify connections before using
     pool_size=10,  # Connection pool size
     max_overflow=20,  # Max connections beyond pool_size
@@ -0,0 +1,38 @@
+"""
+Execution pools for blocking work called from async handlers.
+Nothing blocking should run on the event loop itself:
+- io_pool: network and database bound calls (Gemini, TTS providers, S3, SQLAlchemy)
+- cpu_pool: CPU bound calls that release the GIL (bcrypt password hashing);
+  sized to the cores so they can't oversubscribe
+Document extraction runs inside the upload pipeline on io_pool and hands its
+CPU work to the extraction and OCR process pools (utils/extracts, utils/ocr_pool).
+Plain `def` routes that only touch the database keep running on Starlette's threadpool.
+"""
+import os
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+IO_WORKERS = int(os.getenv("IO_WORKERS", "32"))
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", str(os.cpu_count() or 1)))
+
+io_pool = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="io")
+cpu_pool = ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix="cpu")
+
+
+async def run_io(func: Callable, *args, **kwargs):
+    """Run a blocking I/O call on the I/O pool and await its result"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(io_pool, functools.partial(func, *args, **kwargs))
+
+
+async def run_cpu(func: Callable, *args, **kwargs):
+    """Run a CPU bound call on the CPU pool and await its result"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(cpu_pool, functools.partial(func, *args, **kwargs))
+
+
+def shutdown(wait: bool = False) -> None:
+    io_pool.shutdown(wait=wait)
+    cpu_pool.shutdown(wait=wait)
@@ -0,0 +1,75 @@
+"""
+Streaming upload ingestion.
+Starlette has already buffered the request body by the time /upload runs (in
+memory, or in its own temp file past 1 MB). That buffer is taken over and
+hashed in place, in chunks, instead of being copied again; extraction and the
+S3 multipart upload both read from it.
+Peak memory per upload is about INGEST_CHUNK_SIZE while hashing, plus
+S3_MULTIPART_CHUNK_SIZE x S3_MULTIPART_CONCURRENCY while the multipart upload
+runs (see s3_utils).
+"""
+import io
+import os
+import hashlib
+from typing import BinaryIO
+
+from fastapi import UploadFile
+
+from executors import run_io
+
+# INGEST_CHUNK_SIZE: bytes read per step when hashing an upload
+# INGEST_SPOOL_THRESHOLD: in-process buffers (e.g. audio teed to S3) larger than this are spooled to disk
+INGEST_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", str(1024 * 1024)))
+INGEST_SPOOL_THRESHOLD = int(os.getenv("INGEST_SPOOL_THRESHOLD", str(1024 * 1024)))
+
+
+class UploadSpool:
+    """An ingested upload: content hash, size, and the buffered file it was read from"""
+
+    def __init__(self, file: BinaryIO, filename: str):
+        self.filename = filename
+        self.size = 0
+        self._file = file
+        self._digest = hashlib.md5()
+
+    def hash_contents(self) -> "UploadSpool":
+        """Hash the whole file in chunks (blocking)"""
+        self._file.seek(0)
+        while chunk := self._file.read(INGEST_CHUNK_SIZE):
+            self._digest.update(chunk)
+            self.size += len(chunk)
+        self._file.seek(0)
+        return self
+
+    @property
+    def file_hash(self) -> str:
+        return self._digest.hexdigest()
+
+    def open(self) -> BinaryIO:
+        """The upload positioned at its start; owned by the spool, so callers must not close it"""
+        self._file.seek(0)
+        return self._file
+
+    def source(self) -> BinaryIO:
+        """The upload as a binary file, ready for extract_text"""
+        return self.open()
+
+    def close(self) -> None:
+        """Release the buffer or its temp file"""
+        self._file.close()
+
+
+async def spool_upload(file: UploadFile) -> UploadSpool:
+    """
+    Take over an upload's buffered body and hash it in place on the I/O pool,
+    keeping disk reads off the event loop. The UploadFile is left with an empty
+    buffer, so the request closing it doesn't close the spool, which may
+    outlive the request as a job's input.
+    """
+    spool = UploadSpool(file.file, file.filename)
+    file.file = io.BytesIO()
+    try:
+        return await run_io(spool.hash_contents)
+    except Exception:
+        spool.close()
+        raise
@@ -0,0 +1,184 @@
+"""
+Background job queue.
+Jobs are persisted in the jobs table and claimed by in-process worker threads,
+so the queue works against the app database (SQLite locally, Postgres in
+production) without an external broker.
+"""
+import os
+import time
+import threading
+import traceback
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+from sqlalchemy.orm import Session
+
+import crud
+from database import SessionLocal
+from models import Job
+
+# JOB_WORKERS: worker threads per process
+# JOB_POLL_INTERVAL: seconds between queue polls when idle (enqueue wakes workers early)
+# JOB_STALE_AFTER: seconds without progress after which a running job is considered abandoned
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "2"))
+JOB_STALE_AFTER = int(os.getenv("JOB_STALE_AFTER", "3600"))
+# JOB_BLOB_TTL: seconds an in-process blob waits for its job before it is dropped
+# (e.g. when a worker in another process claimed the job)
+JOB_BLOB_TTL = int(os.getenv("JOB_BLOB_TTL", "900"))
+
+# Terminal job statuses; a blob whose job reached one of these is released
+JOB_FINISHED_STATUSES = ("succeeded", "failed")
+
+_handlers = {}
+_workers = []
+_wakeup = threading.Event()
+_stop = threading.Event()
+
+# In-process handoff of job inputs (e.g. upload bytes) so workers in this
+# process don't need to fetch them back from storage: job id -> (blob, registered at)
+_blobs = {}
+_blobs_lock = threading.Lock()
+
+
+def register(kind: str) -> Callable:
+    """Register handler(db, job, blob) -> result dict for a job kind; blob is None if not handed off in-process"""
+    def decorator(handler: Callable) -> Callable:
+        _handlers[kind] = handler
+        return handler
+    return decorator
+
+
+def enqueue(db: Session, kind: str, payload: dict, user_id: Optional[int] = None,
+            file_id: Optional[int] = None, blob=None) -> Job:
+    """Persist a new job and wake a worker"""
+    if kind not in _handlers:
+        raise ValueError(f"No handler registered for job kind '{kind}'")
+
+    job = crud.create_job(db, kind=kind, payload=payload, user_id=user_id, file_id=file_id, commit=False)
+    # Register the blob before the commit makes the job claimable
+    if blob is not None:
+        with _blobs_lock:
+            _blobs[job.id] = (blob, time.monotonic())
+    try:
+        db.commit()
+    except Exception:
+        db.rollback()
+        with _blobs_lock:
+            _blobs.pop(job.id, None)
+        raise
+    db.refresh(job)
+    _wakeup.set()
+    return job
+
+
+def _close_blob(blob) -> None:
+    close = getattr(blob, "close", None)
+    if close is not None:
+        try:
+            close()
+        except Exception as e:
+            print(f"Failed to release job input: {e}")
+
+
+def _expire_blobs(db: Session) -> None:
+    """
+    Release blobs whose job finished elsewhere, or that waited longer than JOB_BLOB_TTL.
+    A job whose row isn't visible yet (enqueue registers the blob before its
+    commit) is left alone until the TTL.
+    """
+    with _blobs_lock:
+        job_ids = list(_blobs)
+    if not job_ids:
+        return
+
+    statuses = crud.get_job_statuses(db, job_ids)
+    now = time.monotonic()
+    with _blobs_lock:
+        expired = [
+            job_id for job_id in job_ids
+            if job_id in _blobs and (
+                statuses.get(job_id) in JOB_FINISHED_STATUSES
+                or now - _blobs[job_id][1] > JOB_BLOB_TTL
+            )
+        ]
+        blobs = [_blobs.pop(job_id)[0] for job_id in expired]
+    for blob in blobs:
+        _close_blob(blob)
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+@contextmanager
+def stage(db: Session, job: Job, name: str):
+    """Record a stage as running, then done or failed, on the job row"""
+    crud.update_job_stage(db, job.id, name, {"status": "running", "started_at": _now()})
+    try:
+        yield
+    except Exception as e:
+        crud.update_job_stage(db, job.id, name, {"status": "failed", "finished_at": _now(), "error": str(e)})
+        raise
+    crud.update_job_stage(db, job.id, name, {"status": "done", "finished_at": _now()})
+
+
+def run_job(db: Session, job: Job) -> None:
+    """Run a claimed job to completion and persist its outcome"""
+    with _blobs_lock:
+        blob, _ = _blobs.pop(job.id, (None, None))
+
+    try:
+        result = _handlers[job.kind](db, job, blob)
+        crud.finish_job(db, job.id, status="succeeded", result=result)
+    except Exception as e:
+        db.rollback()
+        traceback.print_exc()
+        crud.finish_job(db, job.id, status="failed", error=str(e))
+
+
+def _worker_loop() -> None:
+    while not _stop.is_set():
+        db = SessionLocal()
+        try:
+            _expire_blobs(db)
+            job = crud.claim_next_job(db, kinds=list(_handlers))
+            if job is not None:
+                run_job(db, job)
+                continue
+        except Exception as e:
+            print(f"Job worker error: {e}")
+        finally:
+            db.close()
+
+        _wakeup.wait(JOB_POLL_INTERVAL)
+        _wakeup.clear()
+
+
+def start_workers(count: Optional[int] = None) -> None:
+    """Start worker threads, re-queueing jobs left running by a previous process"""
+    if _workers:
+        return
+
+    db = SessionLocal()
+    try:
+        requeued = crud.requeue_stale_jobs(db, JOB_STALE_AFTER)
+        if requeued:
+            print(f"Re-queued {requeued} interrupted job(s)")
+    finally:
+        db.close()
+
+    _stop.clear()
+    for i in range(count or JOB_WORKERS):
+        worker = threading.Thread(target=_worker_loop, name=f"job-worker-{i}", daemon=True)
+        worker.start()
+        _workers.append(worker)
+
+
+def stop_workers(timeout: float = 5.0) -> None:
+    _stop.set()
+    _wakeup.set()
+    for worker in _workers:
+        worker.join(timeout)
+    _workers.clear()
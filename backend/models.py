@@ -73,6 +73,7 @@ class UploadedFile(Base):
     file_type = Column(String(10), nullable=False)  # pdf or pptx
     file_size = Column(Integer)  # in bytes
     s3_key = Column(String(500))  # S3 object key if using S3
+    content_hash = Column(String(64), index=True)  # MD5 of the file bytes, used for dedup
     extracted_text = Column(Text)
     text_preview = Column(Text)  # First 1000 chars
     upload_date = Column(DateTime(timezone=True), server_default=func.now())
@@ -86,6 +87,22 @@ class UploadedFile(Base):
         return f"<UploadedFile(id={self.id}, filename='{self.filename}')>"
 
 
+class ExtractedPage(Base):
+    """Store per-page extraction results so unchanged pages can be reused on re-processing"""
+    __tablename__ = "extracted_pages"
+
+    id = Column(Integer, primary_key=True, index=True)
+    document_hash = Column(String(64), index=True, nullable=False)  # Hash of the uploaded file
+    page_number = Column(Integer, nullable=False)  # 1-based page or slide number
+    source = Column(String(10), nullable=False)  # 'text' (text layer) or 'ocr'
+    text = Column(Text)
+    content_hash = Column(String(64), index=True, nullable=False)  # Hash of the page's inputs for this source
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self):
+        return f"<ExtractedPage(id={self.id}, page_number={self.page_number}, source='{self.source}')>"
+
+
 class Podcast(Base):
     """Store generated podcast scripts"""
     __tablename__ = "podcasts"
@@ -154,3 +171,24 @@ class UserSession(Base):
 
     def __repr__(self):
         return f"<UserSession(id={self.id}, session_id='{self.session_id}')>"
+
+
+class Job(Base):
+    """Track background processing jobs and their per-stage progress"""
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(50), nullable=False)  # e.g. 'upload'
+    status = Column(String(20), nullable=False, default="queued", index=True)  # queued, running, succeeded, failed
+    stage = Column(String(50))  # Stage currently (or last) running
+    stages = Column(JSON)  # {stage: {status, started_at, finished_at, error}}
+    payload = Column(JSON)  # Handler input
+    result = Column(JSON)  # Handler output
+    error = Column(Text)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=True)
+    file_id = Column(Integer, ForeignKey("uploaded_files.id", ondelete="SET NULL"), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<Job(id={self.id}, kind='{self.kind}', status='{self.status}')>"
@@ -0,0 +1,293 @@
+"""
+Upload processing pipeline: store → extract → script → audio.
+Each stage is a plain function so /upload can run them inline or hand the
+whole pipeline to the background job queue.
+Expensive stages are coalesced per document: concurrent requests for the same
+(file hash, operation, voice, speed) attach to one in-flight generation.
+"""
+import io
+import os
+import tempfile
+from collections import Counter
+from typing import BinaryIO, Callable, Iterator, Optional, Union
+
+from sqlalchemy.orm import Session
+
+import crud
+import jobs
+import s3_utils
+import executors
+import singleflight
+from database import engine, SessionLocal
+from ingest import UploadSpool, INGEST_SPOOL_THRESHOLD
+from models import UploadedFile, Podcast, Job
+from utils.extracts import extract_text
+from utils.gemini import generate_podcast_script
+from utils import timestretch
+from audio import generate_audio_gemini as generate_audio, stretches_locally
+
+PDF_CONTENT_TYPE = "application/pdf"
+PPTX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.presentationml.presentation"
+
+# In-process coalescing on SQLite, Postgres advisory locks across workers otherwise
+flight = singleflight.for_engine(engine)
+
+
+def file_type_for(filename: str) -> str:
+    return os.path.splitext(filename)[1].lower().replace(".", "")
+
+
+def store_upload(spool: UploadSpool, s3_key: str) -> str:
+    """Store the original document in S3 and return its URL"""
+    content_type = PDF_CONTENT_TYPE if file_type_for(spool.filename) == "pdf" else PPTX_CONTENT_TYPE
+    # Large uploads go up as a parallel multipart upload read straight from the buffer
+    return s3_utils.upload_fileobj(spool.open(), s3_key, content_type=content_type)
+
+
+def extract_document(db: Session, source: Union[bytes, str, BinaryIO], filename: str, file_hash: str,
+                     s3_key: str, file_size: int, user_id: Optional[int] = None) -> UploadedFile:
+    """
+    Extract text from an uploaded document (bytes, a local path or a binary file) and save the file record.
+    Concurrent uploads of the same bytes share one extraction and one file record.
+    """
+    def extracted():
+        db_file = crud.get_file_by_hash(db, file_hash)
+        return db_file.id if db_file else None
+
+    def extract():
+        extract_stats = Counter()
+        page_store = crud.PageStore(db, file_hash)
+        text = extract_text(source, filename=filename, stats=extract_stats, page_store=page_store)
+        print(f"Extraction stats for {filename}: {dict(extract_stats)}")
+        if not text:
+            raise ValueError("No text extracted")
+
+        return crud.create_uploaded_file(
+            db=db,
+            filename=filename,
+            file_type=file_type_for(filename),
+            file_size=file_size,
+            extracted_text=text,
+            s3_key=s3_key,
+            user_id=user_id,
+            content_hash=file_hash
+        ).id
+
+    file_id = flight.do(singleflight.flight_key("extract", file_hash), extract, recheck=extracted)
+    # Followers load the leader's record into their own session
+    return claim_document(db, crud.get_uploaded_file(db, file_id), filename, user_id)
+
+
+def claim_document(db: Session, db_file: UploadedFile, filename: str, user_id: Optional[int]) -> UploadedFile:
+    """
+    The user's own record for a document. Identical bytes share one S3 object,
+    one extraction and the finished podcasts, but each user gets a record of
+    their own so the upload shows up in their /files.
+    """
+    if db_file.user_id == user_id:
+        return db_file
+    own = crud.get_user_file_by_hash(db, db_file.content_hash, user_id) if db_file.content_hash else None
+    if own:
+        return own
+
+    own = crud.create_uploaded_file(
+        db=db,
+        filename=filename,
+        file_type=db_file.file_type,
+        file_size=db_file.file_size,
+        extracted_text=db_file.extracted_text,
+        s3_key=db_file.s3_key,
+        user_id=user_id,
+        content_hash=db_file.content_hash
+    )
+    for podcast in crud.get_podcasts_by_file(db, db_file.id):
+        if podcast.audio_url:
+            crud.create_podcast(db=db, file_id=own.id, script=podcast.script, voice_type=podcast.voice_type,
+                                speed=podcast.speed, audio_url=podcast.audio_url)
+    return own
+
+
+def _document_key(db_file: UploadedFile) -> str:
+    return db_file.content_hash or f"file-{db_file.id}"
+
+
+def create_podcast_script(db: Session, db_file: UploadedFile, voice: str = "host",
+                          speed: float = 1.0) -> Podcast:
+    """
+    Return the file's podcast script for voice/speed (without audio yet), generating
+    and saving it only if none exists. Concurrent callers share one Gemini call,
+    and other speeds reuse the canonical 1.0x script.
+    """
+    def saved():
+        podcast = crud.get_latest_podcast(db, db_file.id, voice, speed)
+        return podcast.id if podcast else None
+
+    def generate():
+        if speed != 1.0:
+            script = create_podcast_script(db, db_file, voice, 1.0).script
+        else:
+            script = generate_podcast_script(db_file.extracted_text)
+        return crud.create_podcast(db=db, file_id=db_file.id, script=script, voice_type=voice, speed=speed).id
+
+    key = singleflight.flight_key("script", _document_key(db_file), voice, speed)
+    podcast = crud.get_podcast(db, flight.do(key, generate, recheck=saved))
+    if podcast.file_id != db_file.id:
+        # Coalesced with another user's record of the same document
+        own_id = saved()
+        if own_id:
+            return crud.get_podcast(db, own_id)
+        podcast = crud.create_podcast(db=db, file_id=db_file.id, script=podcast.script, voice_type=voice,
+                                      speed=speed, audio_url=podcast.audio_url)
+    return podcast
+
+
+def render_podcast_audio(db: Session, podcast: Podcast, s3_key: str) -> Podcast:
+    """
+    Synthesize audio for a saved podcast script, upload it and record the URL.
+    Speed variants are time-stretched from the canonical 1.0x audio when possible.
+    Concurrent renders of the same document, voice and speed share one synthesis.
+    """
+    def rendered():
+        current = crud.get_podcast(db, podcast.id)
+        return current.id if current and current.audio_url else None
+
+    def render():
+        audio = _stretch_canonical_audio(db, podcast) if stretches_locally(podcast.speed) else None
+        if audio is None:
+            audio = b"".join(generate_audio(podcast.script, voice=podcast.voice_type, speed=podcast.speed))
+        audio_fileobj = io.BytesIO(audio)
+        audio_url = s3_utils.upload_fileobj(audio_fileobj, s3_key, content_type="audio/mpeg")
+        return crud.update_podcast_audio_url(db, podcast.id, audio_url).id
+
+    key = singleflight.flight_key("audio", _document_key(podcast.file), podcast.voice_type, podcast.speed)
+    rendered_id = flight.do(key, render, recheck=rendered)
+    if rendered_id != podcast.id:
+        # Coalesced with another user's podcast of the same document and script
+        return crud.update_podcast_audio_url(db, podcast.id, crud.get_podcast(db, rendered_id).audio_url)
+    return crud.get_podcast(db, rendered_id)
+
+
+def _stretch_canonical_audio(db: Session, podcast: Podcast) -> Optional[bytes]:
+    """The podcast's audio derived from its 1.0x rendering (rendered first if needed)"""
+    canonical = create_podcast_script(db, podcast.file, podcast.voice_type, 1.0)
+    if canonical.script != podcast.script:
+        return None
+    if not canonical.audio_url:
+        canonical = render_podcast_audio(
+            db, canonical, podcast_audio_key(_document_key(podcast.file), podcast.voice_type)
+        )
+    try:
+        base = s3_utils.download_fileobj(canonical.audio_url.split('/')[-1])
+        return timestretch.time_stretch(base, podcast.speed)
+    except Exception as e:
+        print(f"Failed to derive {podcast.speed}x audio for podcast {podcast.id}: {e}")
+        return None
+
+
+def tee_to_s3(chunks: Iterator[bytes], s3_key: str,
+              on_uploaded: Optional[Callable[[str], None]] = None) -> Iterator[bytes]:
+    """
+    Pass an audio stream through while spooling a copy. Once the stream has
+    completed, the copy is uploaded to S3 on the I/O pool and on_uploaded(url)
+    is called; an abandoned or failed stream is never uploaded.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=INGEST_SPOOL_THRESHOLD)
+    try:
+        for chunk in chunks:
+            spool.write(chunk)
+            yield chunk
+    except BaseException:
+        spool.close()
+        raise
+
+    spool.seek(0)
+    executors.io_pool.submit(_upload_spooled_audio, spool, s3_key, on_uploaded)
+
+
+def _upload_spooled_audio(spool, s3_key: str, on_uploaded: Optional[Callable[[str], None]]) -> None:
+    try:
+        audio_url = s3_utils.upload_fileobj(spool, s3_key, content_type="audio/mpeg")
+        if on_uploaded is not None:
+            on_uploaded(audio_url)
+    except Exception as e:
+        print(f"Failed to cache streamed audio {s3_key}: {e}")
+    finally:
+        spool.close()
+
+
+def record_streamed_podcast(file_id: int, script: str, voice: str, speed: float, audio_url: str) -> None:
+    """Save a podcast whose audio was streamed to the client and then stored in S3"""
+    db = SessionLocal()
+    try:
+        crud.create_podcast(db=db, file_id=file_id, script=script, voice_type=voice, speed=speed,
+                            audio_url=audio_url)
+    finally:
+        db.close()
+
+
+def save_streamed_script(file_id: int, script: str, voice: str = "host", speed: float = 1.0) -> int:
+    """Save a script that was streamed to the client, unless one was saved meanwhile; returns the podcast id"""
+    db = SessionLocal()
+    try:
+        podcast = crud.get_latest_podcast(db, file_id, voice, speed)
+        if podcast is None:
+            podcast = crud.create_podcast(db=db, file_id=file_id, script=script, voice_type=voice, speed=speed)
+        return podcast.id
+    finally:
+        db.close()
+
+
+def podcast_audio_key(file_hash: str, voice: str = "host", speed: float = 1.0) -> str:
+    return f"podcast_{file_hash}_{voice}_speed{float(speed)}.mp3"
+
+
+@jobs.register("upload")
+def run_upload_job(db: Session, job: Job, spool: Optional[UploadSpool] = None) -> dict:
+    """
+    Background handler for an upload that has already been stored in S3.
+    spool is the ingested upload when the job runs in the process that received
+    it; otherwise the original is downloaded back from S3.
+    Stages already recorded on the job (file_id, podcast_id) are skipped, so a
+    job re-queued after a crash resumes where it stopped.
+    """
+    payload = job.payload or {}
+    result = dict(job.result or {})
+
+    with jobs.stage(db, job, "extract"):
+        if job.file_id:
+            db_file = crud.get_uploaded_file(db, job.file_id)
+        else:
+            try:
+                if spool is not None:
+                    source, file_size = spool.source(), spool.size
+                else:
+                    source = s3_utils.download_fileobj(payload["s3_key"])
+                    file_size = len(source)
+                db_file = extract_document(
+                    db, source, payload["filename"], payload["file_hash"],
+                    payload["s3_key"], file_size, user_id=job.user_id
+                )
+            finally:
+                if spool is not None:
+                    spool.close()
+            job = crud.update_job(db, job.id, file_id=db_file.id)
+
+    with jobs.stage(db, job, "script"):
+        podcast = crud.get_podcast(db, result["podcast_id"]) if result.get("podcast_id") else None
+        if podcast is None:
+            podcast = create_podcast_script(db, db_file)
+            result["podcast_id"] = podcast.id
+            job = crud.update_job(db, job.id, result=dict(result))
+
+    with jobs.stage(db, job, "audio"):
+        if not podcast.audio_url:
+            podcast = render_podcast_audio(db, podcast, podcast_audio_key(payload["file_hash"]))
+
+    result.update({
+        "file_id": db_file.id,
+        "filename": db_file.filename,
+        "text_preview": db_file.text_preview,
+        "podcast_id": podcast.id,
+        "audio_url": podcast.audio_url,
+    })
+    return result
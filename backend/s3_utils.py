@@ -1,5 +1,6 @@
 import os
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import ClientError
 from dotenv import load_dotenv
 from typing import BinaryIO, Optional
@@ -13,6 +14,21 @@ S3_PREFIX = os.getenv("S3_PREFIX", "podcasts/")
 if not S3_BUCKET:
     raise ValueError("S3_BUCKET must be set in environment variables")
 
+# Multipart settings: parts are uploaded in parallel, and uploads from disk are
+# streamed part by part, so memory stays around chunk size x concurrency
+# (20 MB with the defaults; S3 parts can't be smaller than 5 MB, so set
+# S3_MULTIPART_CONCURRENCY=1 to keep an upload in single-digit MB at the cost
+# of throughput)
+S3_MULTIPART_THRESHOLD = int(os.getenv("S3_MULTIPART_THRESHOLD", str(8 * 1024 * 1024)))
+S3_MULTIPART_CHUNK_SIZE = int(os.getenv("S3_MULTIPART_CHUNK_SIZE", str(5 * 1024 * 1024)))
+S3_MULTIPART_CONCURRENCY = int(os.getenv("S3_MULTIPART_CONCURRENCY", "4"))
+
+transfer_config = TransferConfig(
+    multipart_threshold=S3_MULTIPART_THRESHOLD,
+    multipart_chunksize=S3_MULTIPART_CHUNK_SIZE,
+    max_concurrency=S3_MULTIPART_CONCURRENCY,
+)
+
 # Initialize S3 client
 s3_client = boto3.client("s3", region_name=AWS_REGION)
 
@@ -38,7 +54,7 @@ def upload_fileobj(fileobj: BinaryIO, key: str, content_type: Optional[str] = No
         key = f"{S3_PREFIX.rstrip('/')}/{key}"
 
     try:
-        s3_client.upload_fileobj(fileobj, S3_BUCKET, key, ExtraArgs=extra_args)
+        s3_client.upload_fileobj(fileobj, S3_BUCKET, key, ExtraArgs=extra_args, Config=transfer_config)
         # Construct S3 URL (virtual-hosted style)
         url = f"https://{S3_BUCKET}.s3.{AWS_REGION}.amazonaws.com/{key}"
         return url
@@ -143,6 +159,55 @@ def download_fileobj(key: str) -> bytes:
         raise RuntimeError(f"Failed to download from S3: {str(e)}")
 
 
+def head_object(key: str) -> Optional[dict]:
+    """
+    Fetch an object's metadata without its body.
+    
+    Args:
+        key: S3 object key (filename)
+        
+    Returns:
+        Dict with size, etag, last_modified and content_type, or None if missing
+    """
+    if S3_PREFIX and not key.startswith(S3_PREFIX):
+        key = f"{S3_PREFIX.rstrip('/')}/{key}"
+
+    try:
+        response = s3_client.head_object(Bucket=S3_BUCKET, Key=key)
+    except ClientError:
+        return None
+    return {
+        "size": response["ContentLength"],
+        "etag": response["ETag"],
+        "last_modified": response["LastModified"],
+        "content_type": response.get("ContentType"),
+    }
+
+
+def get_object_stream(key: str, start: Optional[int] = None, end: Optional[int] = None):
+    """
+    Open an object (or the inclusive byte range start-end) for streaming.
+    
+    Args:
+        key: S3 object key (filename)
+        start, end: optional inclusive byte range
+        
+    Returns:
+        The botocore StreamingBody; read it with iter_chunks() and close it when done
+    """
+    if S3_PREFIX and not key.startswith(S3_PREFIX):
+        key = f"{S3_PREFIX.rstrip('/')}/{key}"
+
+    params = {"Bucket": S3_BUCKET, "Key": key}
+    if start is not None:
+        params["Range"] = f"bytes={start}-{'' if end is None else end}"
+
+    try:
+        return s3_client.get_object(**params)["Body"]
+    except ClientError as e:
+        raise RuntimeError(f"Failed to download from S3: {str(e)}")
+
+
 def file_exists(key: str) -> bool:
     """
     Check if a file exists in S3.
@@ -166,6 +231,7 @@ def file_exists(key: str) -> bool:
 def upload_file(file_path: str, key: str, content_type: Optional[str] = None) -> str:
     """
     Upload a file from disk to S3 and return the public URL.
+    Large files go up as a parallel multipart upload streamed from disk.
     
     Args:
         file_path: Path to file on disk
@@ -184,7 +250,7 @@ def upload_file(file_path: str, key: str, content_type: Optional[str] = None) ->
         key = f"{S3_PREFIX.rstrip('/')}/{key}"
 
     try:
-        s3_client.upload_file(file_path, S3_BUCKET, key, ExtraArgs=extra_args)
+        s3_client.upload_file(file_path, S3_BUCKET, key, ExtraArgs=extra_args, Config=transfer_config)
         # Construct S3 URL
         url = f"https://{S3_BUCKET}.s3.{AWS_REGION}.amazonaws.com/{key}"
         return url
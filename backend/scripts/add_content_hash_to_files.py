@@ -0,0 +1,91 @@
+"""
+Migration script to add an indexed content_hash column to uploaded_files
+and backfill it for existing rows.
+Run this once to update your existing database schema
+"""
+import os
+import re
+import sys
+import hashlib
+from sqlalchemy import text
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from database import engine
+
+# Uploads have been stored as files/{md5}_{filename}
+S3_KEY_HASH = re.compile(r"(?:^|/)files/([0-9a-f]{32})_")
+
+
+def migrate():
+    """Add content_hash column and index to uploaded_files"""
+    with engine.connect() as conn:
+        try:
+            # Check if column already exists
+            result = conn.execute(text("""
+                SELECT column_name
+                FROM information_schema.columns
+                WHERE table_name='uploaded_files' AND column_name='content_hash'
+            """))
+
+            if result.fetchone():
+                print("✅ content_hash column already exists in uploaded_files table")
+            else:
+                conn.execute(text("""
+                    ALTER TABLE uploaded_files
+                    ADD COLUMN content_hash VARCHAR(64)
+                """))
+                print("✅ Added content_hash column to uploaded_files table")
+
+            conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_uploaded_files_content_hash
+                ON uploaded_files (content_hash)
+            """))
+            conn.commit()
+            print("✅ Index ix_uploaded_files_content_hash is in place")
+
+        except Exception as e:
+            print(f"❌ Migration failed: {str(e)}")
+            conn.rollback()
+            raise
+
+
+def backfill():
+    """Fill content_hash from the S3 key, downloading the object when the key has no hash"""
+    with engine.connect() as conn:
+        rows = conn.execute(text("""
+            SELECT id, s3_key FROM uploaded_files WHERE content_hash IS NULL
+        """)).fetchall()
+
+        filled = 0
+        for file_id, s3_key in rows:
+            if not s3_key:
+                continue
+
+            match = S3_KEY_HASH.search(s3_key)
+            if match:
+                content_hash = match.group(1)
+            else:
+                try:
+                    import s3_utils
+                    content_hash = hashlib.md5(s3_utils.download_fileobj(s3_key)).hexdigest()
+                except Exception as e:
+                    print(f"⚠️  Skipping file {file_id}: {e}")
+                    continue
+
+            conn.execute(
+                text("UPDATE uploaded_files SET content_hash = :hash WHERE id = :id"),
+                {"hash": content_hash, "id": file_id}
+            )
+            filled += 1
+
+        conn.commit()
+        print(f"✅ Backfilled content_hash for {filled} of {len(rows)} file(s)")
+
+
+if __name__ == "__main__":
+    print("Running migration to add content_hash to uploaded_files...")
+    migrate()
+    backfill()
+    print("Migration complete!")
@@ -0,0 +1,216 @@
+"""
+Extraction benchmark
+Generates synthetic PDF/PPTX documents offline and runs the extractors on them.
+Each case runs in a fresh interpreter so peak RSS and warm caches don't leak
+between cases. Results are printed as one JSON document, e.g.
+
+    python scripts/benchmark_extraction.py --pages 10 50 > bench_$(git rev-parse --short HEAD).json
+"""
+import os
+import sys
+import io
+import json
+import time
+import random
+import argparse
+import resource
+import subprocess
+from collections import Counter
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fitz
+from pptx import Presentation
+from pptx.util import Inches
+
+KINDS = ["text", "scanned", "mixed", "icons"]
+FORMATS = ["pdf", "pptx"]
+
+WORDS = (
+    "podcast quiz document extraction latency throughput worker cache page slide "
+    "image text layer render budget queue segment provider script audio stream"
+).split()
+
+
+def _paragraph(rng: random.Random, sentences: int = 6) -> str:
+    return " ".join(
+        " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 16))).capitalize() + "."
+        for _ in range(sentences)
+    )
+
+
+def _text_image_png(rng: random.Random, width_pt: float = 500, height_pt: float = 300, dpi: int = 150) -> bytes:
+    """Render a paragraph to a PNG so it carries text only OCR can recover"""
+    doc = fitz.open()
+    page = doc.new_page(width=width_pt, height=height_pt)
+    page.insert_textbox(fitz.Rect(20, 20, width_pt - 20, height_pt - 20), _paragraph(rng), fontsize=12)
+    png = page.get_pixmap(dpi=dpi).tobytes("png")
+    doc.close()
+    return png
+
+
+def _icon_png(rng: random.Random, size: int = 16) -> bytes:
+    pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, size, size), False)
+    pix.set_rect(pix.irect, (rng.randint(0, 255), rng.randint(0, 255), rng.randint(0, 255)))
+    return pix.tobytes("png")
+
+
+def build_pdf(kind: str, pages: int, seed: int = 0) -> bytes:
+    rng = random.Random(seed)
+    doc = fitz.open()
+    logo = _icon_png(rng, size=64)
+
+    for _ in range(pages):
+        page = doc.new_page()  # A4
+        width, height = page.rect.width, page.rect.height
+
+        if kind == "text":
+            page.insert_textbox(fitz.Rect(50, 50, width - 50, height - 50), _paragraph(rng, 20), fontsize=11)
+        elif kind == "scanned":
+            page.insert_image(page.rect, stream=_text_image_png(rng, width, height))
+        elif kind == "mixed":
+            page.insert_textbox(fitz.Rect(50, 50, width - 50, 200), _paragraph(rng), fontsize=11)
+            page.insert_image(fitz.Rect(50, 250, width - 50, height - 50), stream=_text_image_png(rng))
+        elif kind == "icons":
+            page.insert_textbox(fitz.Rect(80, 50, width - 50, height - 50), _paragraph(rng, 10), fontsize=11)
+            page.insert_image(fitz.Rect(width - 90, 10, width - 10, 90), stream=logo)
+            for i in range(20):
+                y = 60 + i * 30
+                page.insert_image(fitz.Rect(50, y, 66, y + 16), stream=_icon_png(rng))
+
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def build_pptx(kind: str, pages: int, seed: int = 0) -> bytes:
+    rng = random.Random(seed)
+    prs = Presentation()
+    layout = prs.slide_layouts[6]  # blank
+    logo = _icon_png(rng, size=64)
+
+    for _ in range(pages):
+        slide = prs.slides.add_slide(layout)
+
+        if kind in ("text", "mixed", "icons"):
+            box = slide.shapes.add_textbox(Inches(1), Inches(0.5), Inches(8), Inches(3))
+            box.text_frame.text = _paragraph(rng)
+        if kind in ("scanned", "mixed"):
+            slide.shapes.add_picture(io.BytesIO(_text_image_png(rng)), Inches(1), Inches(3.5), Inches(8), Inches(3.5))
+        if kind == "icons":
+            slide.shapes.add_picture(io.BytesIO(logo), Inches(9), Inches(0.1), Inches(0.8), Inches(0.8))
+            for i in range(20):
+                slide.shapes.add_picture(io.BytesIO(_icon_png(rng)), Inches(0.3), Inches(0.5 + i * 0.3),
+                                         Inches(0.2), Inches(0.2))
+
+    buffer = io.BytesIO()
+    prs.save(buffer)
+    return buffer.getvalue()
+
+
+def _worker_peak_rss_kb() -> int:
+    """Largest VmHWM among live pool workers (Linux only)"""
+    from utils import extracts, ocr_pool
+
+    pids = []
+    for pool in (extracts._executor, ocr_pool._pool):
+        if pool is not None:
+            pids.extend(getattr(pool, "_processes", {}) or {})
+
+    peak = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        peak = max(peak, int(line.split()[1]))
+        except OSError:
+            continue
+    return peak
+
+
+def run_case(fmt: str, kind: str, pages: int, seed: int) -> dict:
+    """Build one document and time extract_text on it in this process"""
+    from utils.extracts import extract_text
+
+    data = build_pdf(kind, pages, seed) if fmt == "pdf" else build_pptx(kind, pages, seed)
+
+    stats = Counter()
+    started = time.perf_counter()
+    text = extract_text(data, filename=f"bench.{fmt}", stats=stats)
+    elapsed = time.perf_counter() - started
+
+    return {
+        "format": fmt,
+        "kind": kind,
+        "pages": pages,
+        "bytes": len(data),
+        "seconds": round(elapsed, 4),
+        "pages_per_sec": round(pages / elapsed, 3) if elapsed else None,
+        "chars": len(text),
+        "images_seen": stats["images_seen"],
+        "images_ocr": stats["images_ocr"],
+        "images_cached": stats["images_cached"],
+        "stats": {k: round(v, 4) if isinstance(v, float) else v for k, v in stats.items()},
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "peak_rss_workers_kb": _worker_peak_rss_kb(),
+    }
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark text extraction on synthetic documents")
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=FORMATS)
+    parser.add_argument("--kinds", nargs="+", choices=KINDS, default=KINDS)
+    parser.add_argument("--pages", nargs="+", type=int, default=[10, 50])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--single", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        # Child mode: exactly one case, result on stdout
+        result = run_case(args.formats[0], args.kinds[0], args.pages[0], args.seed)
+        print(json.dumps(result))
+        sys.stdout.flush()
+        os._exit(0)  # don't wait on idle pool workers
+
+    # Keep the OCR cache off disk so every case starts cold
+    env = dict(os.environ)
+    env.pop("OCR_CACHE_DIR", None)
+
+    results = []
+    for fmt in args.formats:
+        for kind in args.kinds:
+            for pages in args.pages:
+                proc = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), "--single",
+                     "--formats", fmt, "--kinds", kind, "--pages", str(pages), "--seed", str(args.seed)],
+                    capture_output=True, text=True, env=env
+                )
+                if proc.returncode != 0:
+                    print(f"❌ {fmt}/{kind}/{pages} failed:\n{proc.stderr}", file=sys.stderr)
+                    results.append({"format": fmt, "kind": kind, "pages": pages, "error": proc.stderr.strip()[-2000:]})
+                    continue
+                result = json.loads(proc.stdout.strip().splitlines()[-1])
+                print(f"✅ {fmt}/{kind}/{pages}: {result['pages_per_sec']} pages/sec", file=sys.stderr)
+                results.append(result)
+
+    print(json.dumps({
+        "revision": _git_revision(),
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -9,7 +9,7 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
 from database import engine, Base
-from models import UploadedFile, Podcast, Quiz, QuizQuestion, UserSession
+from models import UploadedFile, ExtractedPage, Podcast, Quiz, QuizQuestion, UserSession, Job
 
 def init_database():
     """Create all database tables"""
@@ -20,10 +20,12 @@ def init_database():
         print("✅ Database tables created successfully!")
         print("\nCreated tables:")
         print("  - uploaded_files")
+        print("  - extracted_pages")
         print("  - podcasts")
         print("  - quizzes")
         print("  - quiz_questions")
         print("  - user_sessions")
+        print("  - jobs")
         
     except Exception as e:
         print(f"❌ Error creating tables: {e}")
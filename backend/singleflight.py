@@ -0,0 +1,106 @@
+"""
+Single-flight coalescing for expensive generations.
+Concurrent calls with the same key attach to one in-flight computation instead
+of each paying for Gemini and TTS. SingleFlight coalesces within a process;
+AdvisoryLockSingleFlight additionally serialises across workers with a
+Postgres advisory lock and re-checks for a finished result once it holds it.
+"""
+import os
+import hashlib
+import threading
+from typing import Callable, Optional, TypeVar
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+T = TypeVar("T")
+
+# SINGLE_FLIGHT_BACKEND: 'auto' (advisory locks on Postgres, in-process otherwise), 'local' or 'db'
+SINGLE_FLIGHT_BACKEND = os.getenv("SINGLE_FLIGHT_BACKEND", "auto")
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """In-process coalescing: one execution per key at a time, shared by all concurrent callers"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key: str, fn: Callable[[], T], recheck: Optional[Callable[[], Optional[T]]] = None) -> T:
+        """
+        Run fn() once for all concurrent callers with the same key and return its result.
+        recheck(), if given, runs first in the leader and short-circuits fn when it
+        returns a value (work finished between the caller's own check and now).
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._execute(key, fn, recheck)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def _execute(self, key: str, fn: Callable[[], T], recheck: Optional[Callable[[], Optional[T]]]) -> T:
+        if recheck is not None:
+            existing = recheck()
+            if existing is not None:
+                return existing
+        return fn()
+
+class AdvisoryLockSingleFlight(SingleFlight):
+    """Cross-worker coalescing using Postgres session advisory locks"""
+
+    def __init__(self, engine: Engine):
+        super().__init__()
+        self.engine = engine
+
+    @staticmethod
+    def lock_id(key: str) -> int:
+        """Map a key onto the signed 64-bit id space of pg_advisory_lock"""
+        return int.from_bytes(hashlib.sha256(key.encode("utf-8")).digest()[:8], "big", signed=True)
+
+    def _execute(self, key: str, fn: Callable[[], T], recheck: Optional[Callable[[], Optional[T]]]) -> T:
+        lock_id = self.lock_id(key)
+        with self.engine.connect() as conn:
+            # Blocks while another worker runs the same key
+            conn.execute(text("SELECT pg_advisory_lock(:id)"), {"id": lock_id})
+            try:
+                return super()._execute(key, fn, recheck)
+            finally:
+                conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": lock_id})
+                conn.commit()
+
+
+def for_engine(engine: Engine, backend: str = None) -> SingleFlight:
+    """Pick the single-flight implementation for a database engine"""
+    backend = backend or SINGLE_FLIGHT_BACKEND
+    if backend == "db" or (backend == "auto" and engine.dialect.name == "postgresql"):
+        return AdvisoryLockSingleFlight(engine)
+    return SingleFlight()
+
+
+def flight_key(operation: str, file_hash: str, voice: str = "", speed: float = 1.0) -> str:
+    return f"{operation}:{file_hash}:{voice}:{float(speed)}"
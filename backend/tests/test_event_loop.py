@@ -0,0 +1,56 @@
+"""
+The event loop keeps serving requests while a podcast script is generating.
+Run from backend/ with: python -m pytest tests
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+# A throwaway SQLite database so importing the app needs no Postgres, and
+# dummy settings for modules that refuse to import without them
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'test_event_loop.db')}")
+os.environ.setdefault("GEMINI_API_KEY", "test")
+os.environ.setdefault("S3_BUCKET", "test")
+os.environ.setdefault("AWS_REGION", "us-east-1")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+import app as app_module
+
+GENERATION_SECONDS = 2.0
+
+
+def slow_generate_podcast_script(text: str) -> str:
+    """Stands in for the Gemini call: blocking, and slow"""
+    time.sleep(GENERATION_SECONDS)
+    return "Host: Welcome to the show.\nGuest: Thanks for having me."
+
+
+def test_root_responds_during_podcast_generation(monkeypatch):
+    monkeypatch.setattr(app_module, "generate_podcast_script", slow_generate_podcast_script)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app_module.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            podcast = asyncio.create_task(client.post("/podcast", json={"text": "Some document text"}))
+            # Let the podcast request reach its blocking generation
+            await asyncio.sleep(0.2)
+
+            started = time.perf_counter()
+            health = await client.get("/")
+            health_seconds = time.perf_counter() - started
+            generating = not podcast.done()
+
+            return health, health_seconds, generating, await podcast
+
+    health, health_seconds, generating, podcast = asyncio.run(scenario())
+
+    assert health.status_code == 200
+    assert health.json()["status"] == "healthy"
+    assert generating, "podcast generation finished before / was served"
+    assert health_seconds < GENERATION_SECONDS / 2
+    assert podcast.status_code == 200
+    assert podcast.json()["podcast_script"].startswith("Host:")
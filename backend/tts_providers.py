@@ -0,0 +1,302 @@
+"""
+TTS provider clients.
+Each provider keeps one pooled keep-alive requests.Session (so segments reuse
+DNS, TCP and TLS setup), its own concurrency limit, retry policy, latency
+metrics and a circuit breaker. Base URLs come from the environment so the
+clients can be pointed at a local stub server.
+ProviderRouter picks providers in order, skipping ones whose breaker is open,
+and can optionally hedge a slow request onto the next provider after the first
+one's p95.
+"""
+import os
+import time
+import threading
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# TTS_POOL_SIZE: keep-alive connections per provider
+# TTS_RETRIES: retries for connection errors and 429/5xx responses (read
+# timeouts are not retried: a stalled provider should fail over, not wait again)
+# TTS_TIMEOUT: seconds per request
+TTS_POOL_SIZE = int(os.getenv("TTS_POOL_SIZE", "8"))
+TTS_RETRIES = int(os.getenv("TTS_RETRIES", "2"))
+TTS_TIMEOUT = float(os.getenv("TTS_TIMEOUT", "15"))
+
+STREAMELEMENTS_URL = os.getenv("TTS_STREAMELEMENTS_URL", "https://api.streamelements.com/kappa/v2/speech")
+RESPONSIVEVOICE_URL = os.getenv("TTS_RESPONSIVEVOICE_URL", "https://responsivevoice.org/responsivevoice/getvoice.php")
+
+# Responses shorter than this are error pages, not audio
+MIN_AUDIO_BYTES = 100
+
+# Latency samples kept per provider for percentiles
+LATENCY_WINDOW = 256
+
+# TTS_BREAKER_FAILURES: consecutive failures that open a provider's breaker
+# TTS_BREAKER_COOLDOWN: seconds an open breaker skips the provider before a probe
+TTS_BREAKER_FAILURES = int(os.getenv("TTS_BREAKER_FAILURES", "5"))
+TTS_BREAKER_COOLDOWN = float(os.getenv("TTS_BREAKER_COOLDOWN", "30"))
+
+# TTS_HEDGE: send to the next provider once the first passes its p95 latency.
+# Off by default: providers have different voices (the host is Brian on
+# StreamElements, UK English Male on ResponsiveVoice), so every hedge that wins
+# switches the speaker's voice mid-podcast. Enable it when bounded tail latency
+# matters more than a consistent voice.
+# TTS_HEDGE_DELAY: hedge delay used until a provider has TTS_HEDGE_MIN_SAMPLES
+# latencies; kept well above a normal response so warm-up rarely hedges
+TTS_HEDGE = os.getenv("TTS_HEDGE", "false").lower() == "true"
+TTS_HEDGE_DELAY = float(os.getenv("TTS_HEDGE_DELAY", "8"))
+TTS_HEDGE_MIN_SAMPLES = int(os.getenv("TTS_HEDGE_MIN_SAMPLES", "20"))
+
+
+def _percentile(samples, fraction: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class TTSProvider:
+    """A TTS HTTP endpoint with a pooled session, a concurrency limit and metrics"""
+
+    name = "provider"
+
+    def __init__(self, url: str, concurrency: int, max_chars: int, pool_size: int = TTS_POOL_SIZE,
+                 retries: int = TTS_RETRIES, timeout: float = TTS_TIMEOUT):
+        self.url = url
+        # Longest text accepted in one request
+        self.max_chars = max_chars
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=max(pool_size, concurrency),
+            max_retries=Retry(
+                total=None,
+                connect=retries,
+                read=0,
+                status=retries,
+                other=0,
+                backoff_factor=0.2,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=frozenset(["GET"]),
+                raise_on_status=False
+            )
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.concurrency = concurrency
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self.counters = Counter()
+        self._consecutive_failures = 0
+        self._open_until = 0.0
+        self._probe_started = 0.0
+
+    def params(self, text: str, voice: str, speed: float) -> dict:
+        raise NotImplementedError
+
+    def synthesize(self, text: str, voice: str, speed: float) -> Optional[bytes]:
+        """Audio for text, or None when the provider fails or returns no audio"""
+        audio = None
+        with self._slots:
+            # Timed from here so queueing for a slot doesn't count as provider latency
+            started = time.perf_counter()
+            try:
+                response = self.session.get(self.url, params=self.params(text, voice, speed), timeout=self.timeout)
+                if response.status_code == 200 and len(response.content) > MIN_AUDIO_BYTES:
+                    audio = response.content
+                else:
+                    print(f"{self.name} returned {response.status_code} ({len(response.content)} bytes)")
+            except requests.RequestException as e:
+                print(f"{self.name} request failed: {e}")
+            finally:
+                self._record(time.perf_counter() - started, audio is not None)
+        return audio
+
+    def _record(self, seconds: float, ok: bool) -> None:
+        with self._lock:
+            self._latencies.append(seconds)
+            self.counters["requests"] += 1
+            self.counters["ok" if ok else "failed"] += 1
+            self._probe_started = 0.0
+            if ok:
+                self._consecutive_failures = 0
+                self._open_until = 0.0
+            else:
+                self._consecutive_failures += 1
+                if self._consecutive_failures >= TTS_BREAKER_FAILURES:
+                    if self._open_until <= time.monotonic():
+                        print(f"{self.name} circuit opened after {self._consecutive_failures} failures")
+                        self.counters["breaker_opened"] += 1
+                    self._open_until = time.monotonic() + TTS_BREAKER_COOLDOWN
+
+    def available(self) -> bool:
+        """
+        Whether the breaker lets a request through: closed, or open past its
+        cooldown, in which case one probe per cooldown is admitted (half-open).
+        """
+        with self._lock:
+            if self._consecutive_failures < TTS_BREAKER_FAILURES:
+                return True
+            now = time.monotonic()
+            if now < self._open_until or now - self._probe_started < TTS_BREAKER_COOLDOWN:
+                return False
+            self._probe_started = now
+            return True
+
+    def breaker_state(self) -> str:
+        with self._lock:
+            if self._consecutive_failures < TTS_BREAKER_FAILURES:
+                return "closed"
+            return "open" if time.monotonic() < self._open_until else "half-open"
+
+    def hedge_delay(self) -> float:
+        """Seconds to wait on this provider before hedging: its p95 once known"""
+        with self._lock:
+            samples = list(self._latencies)
+        if len(samples) < TTS_HEDGE_MIN_SAMPLES:
+            return TTS_HEDGE_DELAY
+        return _percentile(samples, 0.95)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            samples = list(self._latencies)
+            counters = dict(self.counters)
+        return {
+            **counters,
+            "p50_seconds": _percentile(samples, 0.5),
+            "p95_seconds": _percentile(samples, 0.95),
+            "breaker": self.breaker_state(),
+        }
+
+
+class StreamElementsProvider(TTSProvider):
+    """StreamElements speech API (Host=Brian, Guest=Amy); speed is not supported"""
+
+    name = "streamelements"
+    voices = {"host": "Brian", "guest": "Amy"}
+
+    def params(self, text: str, voice: str, speed: float) -> dict:
+        return {"voice": self.voices.get(voice, "Brian"), "text": text}
+
+
+class ResponsiveVoiceProvider(TTSProvider):
+    """ResponsiveVoice (Host=UK English Male, Guest=US English Female)"""
+
+    name = "responsivevoice"
+    voices = {"host": "UK English Male", "guest": "US English Female"}
+
+    def params(self, text: str, voice: str, speed: float) -> dict:
+        return {
+            "t": text,
+            "tl": "en",
+            "sv": self.voices.get(voice, "UK English Male"),
+            "pitch": 0.5,
+            "rate": speed,
+            "vol": 1,
+        }
+
+
+# Providers in the order they are tried
+providers: Dict[str, TTSProvider] = {
+    "streamelements": StreamElementsProvider(
+        STREAMELEMENTS_URL,
+        int(os.getenv("TTS_CONCURRENCY_STREAMELEMENTS", "4")),
+        int(os.getenv("TTS_MAX_CHARS_STREAMELEMENTS", "500"))
+    ),
+    "responsivevoice": ResponsiveVoiceProvider(
+        RESPONSIVEVOICE_URL,
+        int(os.getenv("TTS_CONCURRENCY_RESPONSIVEVOICE", "2")),
+        int(os.getenv("TTS_MAX_CHARS_RESPONSIVEVOICE", "300"))
+    ),
+}
+
+
+class ProviderRouter:
+    """
+    Routes a synthesis request across providers in preference order.
+    Providers with an open breaker are skipped (unless every breaker is open).
+    With hedging (TTS_HEDGE), if the current provider has not answered within
+    its p95 latency the next one is started too, and the first audio back wins;
+    the line may then be spoken in the other provider's voice.
+    """
+
+    def __init__(self, providers: Dict[str, TTSProvider], hedge: bool = TTS_HEDGE):
+        self.providers = providers
+        self.hedge = hedge
+        self.counters = Counter()
+        # Enough threads for every provider slot plus requests still queued on a slot
+        self._pool = ThreadPoolExecutor(
+            max_workers=2 * sum(p.concurrency for p in providers.values()),
+            thread_name_prefix="tts-hedge"
+        ) if hedge else None
+
+    def candidates(self):
+        healthy = [p for p in self.providers.values() if p.available()]
+        return healthy or list(self.providers.values())
+
+    def synthesize(self, text: str, voice: str, speed: float) -> Tuple[bytes, Optional[str]]:
+        """Audio for text and the provider that produced it, or (b"", None)"""
+        candidates = self.candidates()
+        if not self.hedge or len(candidates) < 2:
+            for provider in candidates:
+                audio = provider.synthesize(text, voice, speed)
+                if audio:
+                    return audio, provider.name
+            return b"", None
+        return self._hedged(candidates, text, voice, speed)
+
+    def _hedged(self, candidates, text: str, voice: str, speed: float) -> Tuple[bytes, Optional[str]]:
+        pending = {}
+        remaining = list(candidates)
+
+        def start_next():
+            provider = remaining.pop(0)
+            pending[self._pool.submit(provider.synthesize, text, voice, speed)] = provider
+
+        start_next()
+        while pending:
+            # Wait for an answer, or for the newest request to pass its p95
+            newest = list(pending.values())[-1]
+            timeout = newest.hedge_delay() if remaining else None
+            done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+
+            if not done:
+                self.counters["hedged"] += 1
+                start_next()
+                continue
+
+            for future in done:
+                provider = pending.pop(future)
+                audio = future.result()
+                if audio:
+                    if pending:
+                        self.counters[f"hedge_won_{provider.name}"] += 1
+                    return audio, provider.name
+            # A failure moves straight on to the next provider
+            if remaining and not pending:
+                start_next()
+
+        return b"", None
+
+    def metrics(self) -> dict:
+        return {"router": dict(self.counters), **{name: p.metrics() for name, p in self.providers.items()}}
+
+
+router = ProviderRouter(providers)
+
+
+def max_request_chars() -> int:
+    """Longest text every provider accepts, so a planned segment can fall back anywhere"""
+    return min(provider.max_chars for provider in providers.values())
+
+
+def provider_metrics() -> dict:
+    return router.metrics()
@@ -0,0 +1,163 @@
+import os
+import time
+import struct
+import threading
+from collections import Counter, OrderedDict
+from typing import Optional
+
+
+class LRUCache:
+    """Bounded, thread-safe in-memory LRU cache"""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key: str, value) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class DiskCache:
+    """
+    On-disk cache storing one file per key, sharded by key prefix.
+    With max_bytes set, the least recently used entries (by mtime, refreshed on
+    read) are evicted once the directory grows past the limit.
+    """
+
+    def __init__(self, directory: str, max_bytes: Optional[int] = None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._size = sum(size for _, _, size in self._entries()) if max_bytes else 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def _entries(self):
+        """(path, mtime, size) for every stored entry"""
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield path, st.st_mtime, st.st_size
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = f.read()
+            if self.max_bytes:
+                os.utime(path)
+            return value
+        except OSError:
+            return None
+
+    def set(self, key: str, value: bytes) -> None:
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temp file first so readers never see a partial entry
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(value)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Failed to write cache entry {key}: {e}")
+            return
+
+        if self.max_bytes:
+            with self._lock:
+                self._size += len(value)
+                if self._size > self.max_bytes:
+                    self._evict()
+
+    def _evict(self) -> None:
+        """Drop least recently used entries until the cache is back under 90% of max_bytes"""
+        entries = sorted(self._entries(), key=lambda entry: entry[1])
+        self._size = sum(size for _, _, size in entries)
+        target = self.max_bytes * 0.9
+        for path, _, size in entries:
+            if self._size <= target:
+                break
+            try:
+                os.remove(path)
+                self._size -= size
+            except OSError:
+                continue
+
+
+class TieredCache:
+    """
+    In-memory LRU in front of an optional on-disk tier (values are bytes).
+    With ttl set, entries expire ttl seconds after they were stored, in both
+    tiers. Hits per tier, misses and expiries are counted in stats.
+    """
+
+    # Stored entries carry their expiry time as a big-endian double
+    _EXPIRY = struct.Struct(">d")
+
+    def __init__(self, memory: LRUCache, disk: Optional[DiskCache] = None, ttl: Optional[float] = None):
+        self.memory = memory
+        self.disk = disk
+        self.ttl = ttl
+        self.stats = Counter()
+
+    def _unwrap(self, entry: bytes) -> Optional[bytes]:
+        if not self.ttl:
+            return entry
+        if len(entry) < self._EXPIRY.size:
+            return None
+        (expires_at,) = self._EXPIRY.unpack_from(entry)
+        if expires_at < time.time():
+            self.stats["expired"] += 1
+            return None
+        return entry[self._EXPIRY.size:]
+
+    def get(self, key: str) -> Optional[bytes]:
+        entry = self.memory.get(key)
+        if entry is not None:
+            value = self._unwrap(entry)
+            if value is not None:
+                self.stats["hits_memory"] += 1
+                return value
+
+        if self.disk is not None:
+            entry = self.disk.get(key)
+            value = self._unwrap(entry) if entry is not None else None
+            if value is not None:
+                # Promote disk hits so repeated lookups stay in memory
+                self.memory.set(key, entry)
+                self.stats["hits_disk"] += 1
+                return value
+
+        self.stats["misses"] += 1
+        return None
+
+    def set(self, key: str, value: bytes) -> None:
+        entry = self._EXPIRY.pack(time.time() + self.ttl) + value if self.ttl else value
+        self.memory.set(key, entry)
+        if self.disk is not None:
+            self.disk.set(key, entry)
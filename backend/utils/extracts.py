@@ -1,72 +1,455 @@
-import pdfplumber
 from pptx import Presentation
 import fitz
 from PIL import Image
-import pytesseract
 import io
 import os
+import hashlib
+import tempfile
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
+from utils.cache import LRUCache, DiskCache, TieredCache
+from utils import ocr_pool
+
+# Page-parallel PDF extraction settings
+# EXTRACT_WORKERS: size of the shared process pool (defaults to the number of cores)
+# EXTRACT_DOC_WORKERS: max page ranges of one document queued or running on the
+# pool at a time, so concurrent uploads share the pool instead of queueing behind
+# one large document
+# EXTRACT_PAGE_BUDGET: max pages handed to a single worker task
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+EXTRACT_DOC_WORKERS = int(os.getenv("EXTRACT_DOC_WORKERS", str(max(1, EXTRACT_WORKERS // 2))))
+EXTRACT_PAGE_BUDGET = int(os.getenv("EXTRACT_PAGE_BUDGET", "16"))
+
+# OCR result cache keyed by a hash of the image bytes
+# OCR_CACHE_SIZE: max entries kept in memory per process
+# OCR_CACHE_DIR: optional directory for a shared on-disk tier
+OCR_CACHE_SIZE = int(os.getenv("OCR_CACHE_SIZE", "2048"))
+OCR_CACHE_DIR = os.getenv("OCR_CACHE_DIR")
+
+# Skip OCR on pages whose text layer already covers at least this fraction of the page
+OCR_SKIP_TEXT_COVERAGE = float(os.getenv("OCR_SKIP_TEXT_COVERAGE", "0.5"))
+
+# Pre-OCR admission filter
+# OCR_MIN_SIDE: images narrower or shorter than this (px) are bullets/icons and skipped
+# OCR_MIN_ENTROPY: grayscale entropy (bits) below which an image is a flat fill or background
+# OCR_TARGET_DPI: images are downsampled to this resolution at their displayed size
+# OCR_MAX_SIDE: longest side cap (px) when the displayed size is unknown
+OCR_MIN_SIDE = int(os.getenv("OCR_MIN_SIDE", "32"))
+OCR_MIN_ENTROPY = float(os.getenv("OCR_MIN_ENTROPY", "1.0"))
+OCR_TARGET_DPI = int(os.getenv("OCR_TARGET_DPI", "300"))
+OCR_MAX_SIDE = int(os.getenv("OCR_MAX_SIDE", "4000"))
+
+# Settings that change OCR output (engine, language, admission filter) are
+# folded into the OCR cache key and the page store's content hashes
+OCR_SETTINGS_TAG = (
+    f"{ocr_pool.OCR_ENGINE}:{ocr_pool.OCR_LANG}:"
+    f"{OCR_MIN_SIDE}:{OCR_MIN_ENTROPY}:{OCR_TARGET_DPI}:{OCR_MAX_SIDE}"
+)
+
+ocr_cache = TieredCache(LRUCache(OCR_CACHE_SIZE), DiskCache(OCR_CACHE_DIR) if OCR_CACHE_DIR else None)
+
+# Inputs larger than this are spooled to a private temp file instead of being
+# parsed (and shipped to pool workers) from memory
+EXTRACT_MAX_IN_MEMORY_BYTES = int(os.getenv("EXTRACT_MAX_IN_MEMORY_BYTES", str(32 * 1024 * 1024)))
+
+_executor = None
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """Return the shared extraction process pool, creating it on first use"""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=EXTRACT_WORKERS, mp_context=ocr_pool.process_context())
+    return _executor
+
+
+def split_page_ranges(page_count: int, page_budget: int) -> list:
+    """Split [0, page_count) into consecutive (start, end) ranges of at most page_budget pages"""
+    page_budget = max(1, page_budget)
+    return [(start, min(start + page_budget, page_count)) for start in range(0, page_count, page_budget)]
+
+
+def prepare_for_ocr(image_bytes: bytes, display_inches: tuple = None, stats: Counter = None):
+    """
+    Admission filter run before tesseract.
+    Returns a PIL image ready for OCR, or None when the image should be skipped.
+    display_inches is the (width, height) the image is rendered at, if known.
+    """
+    stats = stats if stats is not None else Counter()
+
+    image = Image.open(io.BytesIO(image_bytes))
+    width, height = image.size
+
+    if min(width, height) < OCR_MIN_SIDE:
+        stats["skipped_too_small"] += 1
+        return None
+
+    # Entropy on a thumbnail is enough to spot flat fills and gradients
+    probe = image.convert("L")
+    probe.thumbnail((256, 256))
+    if probe.entropy() < OCR_MIN_ENTROPY:
+        stats["skipped_low_entropy"] += 1
+        return None
+
+    if display_inches and display_inches[0] > 0 and display_inches[1] > 0:
+        scale = min(OCR_TARGET_DPI * display_inches[0] / width, OCR_TARGET_DPI * display_inches[1] / height)
+    else:
+        scale = OCR_MAX_SIDE / max(width, height)
+
+    if scale < 1.0:
+        new_size = (max(1, int(width * scale)), max(1, int(height * scale)))
+        image = image.resize(new_size, Image.LANCZOS)
+        stats["images_downscaled"] += 1
+
+    return image
+
+
+def submit_ocr(images: list, stats: Counter = None) -> tuple:
+    """Resolve cache hits and queue the misses on the OCR pool; pass the result to collect_ocr"""
+    stats = stats if stats is not None else Counter()
+    texts = [None] * len(images)
+    misses = {}
+
+    for index, (image_bytes, display_inches) in enumerate(images):
+        stats["images_seen"] += 1
+        key = hashlib.sha256(OCR_SETTINGS_TAG.encode("utf-8") + image_bytes).hexdigest()
+        cached = ocr_cache.get(key)
+        if cached is not None:
+            stats["images_cached"] += 1
+            texts[index] = cached.decode("utf-8")
+        elif key in misses:
+            # Same image repeated within the document
+            stats["images_cached"] += 1
+            misses[key][1].append(index)
+        else:
+            misses[key] = ((image_bytes, display_inches), [index])
+
+    keys = list(misses)
+    pending = ocr_pool.submit_images([misses[key][0] for key in keys], prepare=prepare_for_ocr)
+    return texts, keys, [misses[key][1] for key in keys], pending
+
+
+def collect_ocr(submitted: tuple, stats: Counter = None) -> list:
+    """Wait for OCR queued by submit_ocr, caching results; failed images come back as empty strings"""
+    texts, keys, indexes, pending = submitted
+    results = ocr_pool.collect_results(pending, stats)
+
+    for key, key_indexes, text in zip(keys, indexes, results):
+        # Skipped images are cached as "" so repeats are not decoded again;
+        # failures and timeouts are not cached
+        if text is not None:
+            ocr_cache.set(key, text.encode("utf-8"))
+        for index in key_indexes:
+            texts[index] = text or ""
+
+    return texts
+
+
+def open_pdf(source):
+    """Open a PDF from a path or from in-memory bytes"""
+    if isinstance(source, (bytes, bytearray)):
+        return fitz.open(stream=source, filetype="pdf")
+    return fitz.open(source)
+
+
+def iter_pdf_pages(pdf_doc, start: int, end: int):
+    """
+    Single pass over pages [start, end) of an open fitz document.
+    Yields (page_index, text, images) one page at a time, where images holds
+    (encoded bytes, displayed size in inches) for the page's embedded images
+    that still need OCR.
+    """
+    for page_index in range(start, end):
+        page = pdf_doc.load_page(page_index)
+
+        # block_type 0 is text, 1 is image
+        text_blocks = [b for b in page.get_text("blocks") if b[6] == 0]
+        text = "\n".join(b[4].strip() for b in text_blocks if b[4].strip())
+
+        page_area = abs(page.rect) or 1.0
+        text_area = sum((b[2] - b[0]) * (b[3] - b[1]) for b in text_blocks)
+
+        images = []
+        if text_area / page_area < OCR_SKIP_TEXT_COVERAGE:
+            seen = set()
+            for img in page.get_images(full=True):
+                xref = img[0]
+                if xref in seen:
+                    continue
+                seen.add(xref)
+                base_image = pdf_doc.extract_image(xref)
+                image_bytes = base_image.get("image") if base_image else None
+                if not image_bytes:
+                    continue
+                rects = page.get_image_rects(xref)
+                display_inches = (rects[0].width / 72, rects[0].height / 72) if rects else None
+                images.append((image_bytes, display_inches))
+
+        yield page_index, text, images
+
+
+def extract_pdf_page_range(source, start: int, end: int) -> list:
+    """
+    Parse pages [start, end) without OCR.
+    Returns [(page_index, text, images)] in page order; images are OCR'd by the caller.
+    """
+    with open_pdf(source) as pdf_doc:
+        return list(iter_pdf_pages(pdf_doc, start, end))
+
+
+def _timed_page_range(source, start: int, end: int) -> tuple:
+    started = time.perf_counter()
+    pages = extract_pdf_page_range(source, start, end)
+    return pages, time.perf_counter() - started
+
+
+def _submit_timed_pages(timed_pages: tuple, stats: Counter, page_store=None) -> tuple:
+    pages, parse_seconds = timed_pages
+    stats["parse_seconds"] += parse_seconds
+    return _submit_pages(pages, stats, page_store)
+
+
+def page_content_hash(images: list) -> str:
+    """Hash of a page's OCR inputs: its image bytes plus the OCR settings"""
+    digest = hashlib.sha256(OCR_SETTINGS_TAG.encode("utf-8"))
+    for image_bytes, _ in images:
+        digest.update(hashlib.sha256(image_bytes).digest())
+    return digest.hexdigest()
+
+
+def _submit_pages(pages: list, stats: Counter, page_store=None) -> tuple:
+    """
+    Queue OCR for a run of (page_index, text, images) pages.
+    With a page_store, pages whose OCR inputs hash to an already stored result
+    are reused instead of OCR'd. Image bytes are not kept once queued: the
+    returned pages are (page_index, text, image_count).
+    """
+    page_hashes = [page_content_hash(images) if images else None for _, _, images in pages]
+
+    known = {}
+    if page_store is not None:
+        known = page_store.lookup([h for h in page_hashes if h])
+
+    images = []
+    for (_, _, page_images), page_hash in zip(pages, page_hashes):
+        if page_hash and page_hash not in known:
+            images.extend(page_images)
+    ocr_submitted = submit_ocr(images, stats)
+    pages = [(page_index, text, len(page_images)) for page_index, text, page_images in pages]
+    return pages, page_hashes, known, ocr_submitted
+
+
+def _assemble_pages(submitted: tuple, stats: Counter, page_store=None) -> list:
+    """Join each page's text layer and OCR text, in page order, saving pages to page_store as they finish"""
+    pages, page_hashes, known, ocr_submitted = submitted
+    ocr_texts = iter(collect_ocr(ocr_submitted, stats))
 
-def extract_text_from_pdf(path: str) -> str:
     text_parts = []
+    for (page_index, text, image_count), page_hash in zip(pages, page_hashes):
+        if text:
+            text_parts.append(text)
+            if page_store is not None:
+                page_store.save(page_index + 1, "text", text, hashlib.sha256(text.encode("utf-8")).hexdigest())
 
-    # Try direct text extraction first
-    with pdfplumber.open(path) as pdf:
-        for page in pdf.pages:
-            txt = page.extract_text()
-            if txt:
-                text_parts.append(txt)
-
-    # OCR fallback
-    pdf_doc = fitz.open(path)
-    for page_index, page in enumerate(pdf_doc):
-        for img_index, img in enumerate(page.get_images(full=True)):
-            xref = img[0]
-            base_image = pdf_doc.extract_image(xref)
-            image_bytes = base_image.get("image")
-            image_ext = base_image.get("ext", "")
-            if not image_bytes:
-                continue
-
-            try:
-                # safer open via BytesIO
-                image = Image.open(io.BytesIO(image_bytes))
-                ocr_text = pytesseract.image_to_string(image)
-                if ocr_text.strip():
-                    text_parts.append(ocr_text)
-            except Exception as e:
-                print(f"Skipping image on page {page_index+1}, index {img_index}: {e}")
-                continue
+        if not page_hash:
+            continue
 
-    return "\n".join(text_parts)
+        if page_hash in known:
+            stats["pages_reused"] += 1
+            ocr_text = known[page_hash]
+        else:
+            page_ocr = [next(ocr_texts) for _ in range(image_count)]
+            ocr_text = "\n".join(t for t in page_ocr if t.strip())
+
+        if page_store is not None:
+            page_store.save(page_index + 1, "ocr", ocr_text, page_hash)
+
+        if ocr_text:
+            text_parts.append(ocr_text)
+    return text_parts
+
+
+def _ocr_done(submitted: tuple) -> bool:
+    pending = submitted[3][3]
+    return all(future.done() for future in pending)
 
 
-def extract_text_from_pptx(path: str) -> str:
-    prs = Presentation(path)
+def _assemble_as_ready(submitted, stats: Counter, page_store=None, ahead: int = 1) -> list:
+    """
+    Assemble submitted ranges in page order, each as soon as its OCR is done.
+    At most ahead ranges wait on OCR at once; past that the oldest is waited
+    for, so parsing can't run far ahead of OCR.
+    """
     text_parts = []
+    waiting = deque()
+    for range_submitted in submitted:
+        waiting.append(range_submitted)
+        while waiting and (len(waiting) > ahead or _ocr_done(waiting[0])):
+            text_parts.extend(_assemble_pages(waiting.popleft(), stats, page_store))
+    while waiting:
+        text_parts.extend(_assemble_pages(waiting.popleft(), stats, page_store))
+    return text_parts
 
-    for slide in prs.slides:
-        for shape in slide.shapes:
-            if hasattr(shape, "text") and shape.text:
-                text_parts.append(shape.text)
 
-    # OCR for images
-    for slide in prs.slides:
+def extract_text_from_pdf(source, max_workers: int = None, page_budget: int = None,
+                          stats: Counter = None, page_store=None) -> str:
+    """
+    Extract text from a PDF path or bytes.
+    Page ranges are parsed on the shared extraction pool, at most max_workers
+    (default EXTRACT_DOC_WORKERS) of this document's ranges at a time, and their
+    images OCR'd on the OCR pool as each range arrives; each range is assembled
+    in page order and released as soon as its OCR finishes, keeping only text,
+    hashes and image counts meanwhile. OCR counters are added to stats if
+    given, and per-page results are reused from / written to page_store if given.
+    """
+    stats = stats if stats is not None else Counter()
+    max_workers = max_workers or EXTRACT_DOC_WORKERS
+    page_budget = page_budget or EXTRACT_PAGE_BUDGET
+
+    with open_pdf(source) as pdf_doc:
+        page_count = pdf_doc.page_count
+
+    ranges = split_page_ranges(page_count, page_budget)
+
+    # Small documents are not worth the process hop
+    if max_workers <= 1 or len(ranges) <= 1:
+        submitted = (
+            _submit_timed_pages(_timed_page_range(source, start, end), stats, page_store)
+            for start, end in ranges
+        )
+    else:
+        submitted = _parse_ranges_on_pool(source, ranges, max_workers, stats, page_store)
+
+    text_parts = _assemble_as_ready(submitted, stats, page_store, ahead=max(1, max_workers))
+    return "\n".join(text_parts)
+
+
+def _parse_ranges_on_pool(source, ranges: list, max_workers: int, stats: Counter, page_store=None):
+    """
+    Parse page ranges on the shared pool with a sliding window of max_workers
+    ranges in flight, yielding each range in order once its OCR is queued.
+    Workers get a path, never the PDF bytes: in-memory documents are written
+    to a private temp file once.
+    """
+    tmp_path = None
+    if isinstance(source, (bytes, bytearray)):
+        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+            tmp.write(source)
+        source = tmp_path = tmp.name
+
+    try:
+        executor = get_executor()
+        remaining = iter(ranges)
+        window = deque(
+            executor.submit(_timed_page_range, source, start, end)
+            for start, end in (next(remaining) for _ in range(min(max_workers, len(ranges))))
+        )
+        while window:
+            timed_pages = window.popleft().result()
+            next_range = next(remaining, None)
+            if next_range is not None:
+                window.append(executor.submit(_timed_page_range, source, *next_range))
+            range_submitted = _submit_timed_pages(timed_pages, stats, page_store)
+            # Drop the parsed pages (and their image bytes) before handing the range on
+            del timed_pages
+            yield range_submitted
+    finally:
+        if tmp_path:
+            os.remove(tmp_path)
+
+
+def extract_text_from_pptx(source, stats: Counter = None, page_store=None) -> str:
+    """
+    Extract text from a PPTX path or binary file-like object.
+    Slides are walked once; picture OCR is fanned out to the OCR pool and the
+    output keeps slide order (each slide's text, then its pictures' OCR text).
+    Slides are treated as pages for page_store.
+    """
+    stats = stats if stats is not None else Counter()
+    started = time.perf_counter()
+    prs = Presentation(source)
+
+    pages = []
+    for slide_index, slide in enumerate(prs.slides):
+        slide_texts = []
+        images = []
         for shape in slide.shapes:
+            if hasattr(shape, "text") and shape.text:
+                slide_texts.append(shape.text)
             if shape.shape_type == 13:  # picture
-                img_bytes = shape.image.blob
-                image = Image.open(io.BytesIO(img_bytes))
-                ocr_text = pytesseract.image_to_string(image)
-                if ocr_text.strip():
-                    text_parts.append(ocr_text)
+                # Shape extents are in EMU (914400 per inch)
+                display_inches = (shape.width / 914400, shape.height / 914400) if shape.width and shape.height else None
+                images.append((shape.image.blob, display_inches))
+        pages.append((slide_index, "\n".join(slide_texts), images))
+    stats["parse_seconds"] += time.perf_counter() - started
 
+    text_parts = _assemble_pages(_submit_pages(pages, stats, page_store), stats, page_store)
     return "\n".join(text_parts)
 
 
-def extract_text(path: str) -> str:
-    ext = os.path.splitext(path)[1].lower()
+def _source_size(source) -> int:
+    if isinstance(source, (bytes, bytearray)):
+        return len(source)
+    position = source.tell()
+    size = source.seek(0, io.SEEK_END)
+    source.seek(position)
+    return size
+
+
+def extract_text(source, filename: str = None, stats: Counter = None, page_store=None) -> str:
+    """
+    Extract text from a PDF or PPTX.
+
+    source may be a path, raw bytes or a binary file-like object; for the
+    in-memory forms filename is used to pick the format. Inputs above
+    EXTRACT_MAX_IN_MEMORY_BYTES fall back to a private temp file.
+    If stats is given it collects image counters, including how many images
+    the OCR admission filter skipped and why, and per-phase timings
+    (parse_seconds, prepare_seconds, ocr_seconds; summed across workers).
+
+    page_store, if given, provides lookup(content_hashes) -> {content_hash: text}
+    and save(page_number, source, text, content_hash); pages whose OCR inputs
+    are unchanged are served from it instead of being OCR'd again.
+    """
+    if isinstance(source, str):
+        filename = filename or source
+    ext = os.path.splitext(filename or "")[1].lower()
+    if ext not in (".pdf", ".pptx"):
+        raise ValueError("Unsupported file type")
+
+    if isinstance(source, str):
+        return _extract_by_type(source, ext, stats, page_store)
+
+    if _source_size(source) > EXTRACT_MAX_IN_MEMORY_BYTES:
+        tmp = tempfile.NamedTemporaryFile(suffix=ext, delete=False)
+        try:
+            with tmp:
+                if isinstance(source, (bytes, bytearray)):
+                    tmp.write(source)
+                else:
+                    source.seek(0)
+                    while chunk := source.read(1024 * 1024):
+                        tmp.write(chunk)
+            return _extract_by_type(tmp.name, ext, stats, page_store)
+        finally:
+            os.remove(tmp.name)
+
+    if not isinstance(source, (bytes, bytearray)):
+        source.seek(0)
+        if ext == ".pdf":
+            # fitz needs the raw bytes for a stream open
+            source = source.getvalue() if isinstance(source, io.BytesIO) else source.read()
+    return _extract_by_type(source, ext, stats, page_store)
+
+
+def _extract_by_type(source, ext: str, stats: Counter = None, page_store=None) -> str:
     if ext == ".pdf":
-        return extract_text_from_pdf(path)
+        return extract_text_from_pdf(source, stats=stats, page_store=page_store)
     elif ext == ".pptx":
-        return extract_text_from_pptx(path)
+        if isinstance(source, (bytes, bytearray)):
+            source = io.BytesIO(source)
+        return extract_text_from_pptx(source, stats=stats, page_store=page_store)
     else:
         raise ValueError("Unsupported file type")
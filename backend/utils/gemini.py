@@ -1,20 +1,66 @@
 import google.generativeai as genai
 import os
+import re
 import json
-from typing import Optional
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from collections import Counter
+from typing import Iterator, List, Optional, Tuple
+
+from utils.cache import LRUCache, DiskCache, TieredCache
 
 # Configure Gemini API
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 if GEMINI_API_KEY:
     genai.configure(api_key=GEMINI_API_KEY)
 
+SCRIPT_MODEL = "gemini-2.5-flash"
+QUIZ_MODEL = "gemini-2.5-flash"
 
-def generate_podcast_script(text: str) -> str:
-    """Generate a podcast script from extracted text using Gemini."""
-    try:
-        model = genai.GenerativeModel("gemini-2.5-flash")
+# Bump when a prompt template changes so cached generations are not reused
+PODCAST_PROMPT_VERSION = "2"
+SECTION_PROMPT_VERSION = "1"
+STITCH_PROMPT_VERSION = "1"
+QUIZ_PROMPT_VERSION = "1"
 
-        prompt = f"""
+# SCRIPT_CHUNK_CHARS: documents longer than this are scripted section by section.
+# Sized for latency, not the context window: one prompt's generation time grows
+# with the document, while sections run SCRIPT_CONCURRENCY at a time
+# SCRIPT_CONCURRENCY: section scripts generated in parallel
+SCRIPT_CHUNK_CHARS = int(os.getenv("SCRIPT_CHUNK_CHARS", "30000"))
+SCRIPT_CONCURRENCY = int(os.getenv("SCRIPT_CONCURRENCY", "4"))
+
+_section_pool = ThreadPoolExecutor(max_workers=SCRIPT_CONCURRENCY, thread_name_prefix="gemini")
+
+# GENERATION_CACHE_SIZE: generations kept in memory per process
+# GENERATION_CACHE_TTL: seconds a cached generation is served
+# GENERATION_CACHE_DIR: optional directory for a persistent tier, capped at GENERATION_CACHE_MAX_BYTES
+GENERATION_CACHE_SIZE = int(os.getenv("GENERATION_CACHE_SIZE", "256"))
+GENERATION_CACHE_TTL = float(os.getenv("GENERATION_CACHE_TTL", str(7 * 24 * 3600)))
+GENERATION_CACHE_DIR = os.getenv("GENERATION_CACHE_DIR")
+GENERATION_CACHE_MAX_BYTES = int(os.getenv("GENERATION_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+generation_cache = TieredCache(
+    LRUCache(GENERATION_CACHE_SIZE),
+    DiskCache(GENERATION_CACHE_DIR, max_bytes=GENERATION_CACHE_MAX_BYTES) if GENERATION_CACHE_DIR else None,
+    ttl=GENERATION_CACHE_TTL
+)
+
+
+def generation_key(model: str, template_version: str, text: str, **params) -> str:
+    """Cache key over (model, prompt template version, input hash, parameters)"""
+    payload = json.dumps({
+        "model": model,
+        "template": template_version,
+        "input": hashlib.sha256(text.encode("utf-8")).hexdigest(),
+        "params": params,
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _podcast_prompt(text: str) -> str:
+    return f"""
 Convert the following text into an engaging podcast script.  
 Make it conversational, informative, and suitable for audio narration.  
 Add natural transitions, explanations for complex concepts, and maintain an engaging tone throughout.  
@@ -34,18 +80,308 @@ Please format as a natural podcast script with:
 - Compelling conclusion with a closing remark
 """
 
-        response = model.generate_content(prompt)
-        return response.text.strip()
+
+def generate_podcast_script(text: str) -> str:
+    """
+    Generate a podcast script from extracted text using Gemini (cached per input).
+    Long documents are split into sections that are scripted concurrently and
+    joined by a generated intro, transitions and outro.
+    """
+    key = generation_key(SCRIPT_MODEL, PODCAST_PROMPT_VERSION, text, chunk_chars=SCRIPT_CHUNK_CHARS)
+    cached = generation_cache.get(key)
+    if cached is not None:
+        return cached.decode("utf-8")
+
+    try:
+        complete = True
+        if len(text) > SCRIPT_CHUNK_CHARS:
+            script, complete = _generate_sectioned_script(text)
+        else:
+            model = genai.GenerativeModel(SCRIPT_MODEL)
+            prompt = _podcast_prompt(text)
+
+            response = model.generate_content(prompt)
+            script = response.text.strip()
+        # A script missing failed sections is served once but not cached
+        if complete:
+            generation_cache.set(key, script.encode("utf-8"))
+        return script
 
     except Exception as e:
         print(f"Error generating podcast script: {e}")
         return f"Welcome to today's podcast. Let me share some insights from the document: {text[:500]}..."
 
 
+def stream_podcast_script(text: str) -> Iterator[str]:
+    """
+    Yield the podcast script line by line as Gemini produces it. Cached scripts
+    are replayed; long documents yield each section (and its intro or
+    transition) as soon as it and every earlier one are done.
+    A complete stream is cached like generate_podcast_script's result; a
+    failure raises instead of ending the stream early, and so does a long
+    document that lost sections, once its remaining lines have been yielded.
+    """
+    key = generation_key(SCRIPT_MODEL, PODCAST_PROMPT_VERSION, text, chunk_chars=SCRIPT_CHUNK_CHARS)
+    cached = generation_cache.get(key)
+    if cached is not None:
+        yield from _script_lines(cached.decode("utf-8"))
+        return
+
+    lines = []
+    if len(text) > SCRIPT_CHUNK_CHARS:
+        failures = Counter()
+        for part in _iter_sectioned_script(text, failures):
+            for line in _script_lines(part):
+                lines.append(line)
+                yield line
+        if failures["sections"]:
+            raise RuntimeError(f"Script is incomplete: {failures['sections']} section(s) failed to generate")
+    else:
+        pending = ""
+        model = genai.GenerativeModel(SCRIPT_MODEL)
+        for chunk in model.generate_content(_podcast_prompt(text), stream=True):
+            pending += chunk.text
+            *complete, pending = pending.split("\n")
+            for line in _script_lines("\n".join(complete)):
+                lines.append(line)
+                yield line
+        for line in _script_lines(pending):
+            lines.append(line)
+            yield line
+
+    generation_cache.set(key, "\n".join(lines).encode("utf-8"))
+
+
+def _script_lines(script: str) -> List[str]:
+    return [line.strip() for line in script.splitlines() if line.strip()]
+
+
+def split_sections(text: str, chunk_chars: int = SCRIPT_CHUNK_CHARS) -> List[str]:
+    """Split text into sections of at most chunk_chars, at paragraph, then line, then word boundaries"""
+    units = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) <= chunk_chars:
+            units.append(paragraph)
+            continue
+        for line in paragraph.splitlines():
+            while len(line) > chunk_chars:
+                cut = line.rfind(" ", 0, chunk_chars)
+                cut = cut if cut > 0 else chunk_chars
+                units.append(line[:cut])
+                line = line[cut:].strip()
+            if line:
+                units.append(line)
+
+    sections = []
+    current = ""
+    for unit in units:
+        candidate = f"{current}\n\n{unit}" if current else unit
+        if len(candidate) <= chunk_chars:
+            current = candidate
+        else:
+            sections.append(current)
+            current = unit
+    if current:
+        sections.append(current)
+    return sections
+
+
+def _generate_section_script(section: str, index: int, total: int) -> Optional[str]:
+    """Dialogue for one section of a long document, or None if generation failed"""
+    key = generation_key(SCRIPT_MODEL, SECTION_PROMPT_VERSION, section, first=index == 0, last=index == total - 1)
+    cached = generation_cache.get(key)
+    if cached is not None:
+        return cached.decode("utf-8")
+
+    position = "the opening" if index == 0 else "the final" if index == total - 1 else "a middle"
+    prompt = f"""
+You are writing {position} part ({index + 1} of {total}) of an engaging podcast that covers a long document.
+Convert the following section into conversational dialogue between a Host and a Guest.
+Explain complex concepts clearly and keep an engaging tone.
+
+Important:
+- Only include dialogue lines (e.g., Host:, Guest:).
+- Do NOT include any stage directions like [intro music], [sound effect], or narration outside dialogue.
+- Do NOT open or close the show; an introduction and conclusion are added separately.
+
+Section:
+{section}
+"""
+    try:
+        model = genai.GenerativeModel(SCRIPT_MODEL)
+        script = model.generate_content(prompt).text.strip()
+        generation_cache.set(key, script.encode("utf-8"))
+        return script
+    except Exception as e:
+        print(f"Error generating script for section {index + 1}/{total}: {e}")
+        return None
+
+
+def _stitch_lines(part: str, prompt: str, key_text: str) -> List[str]:
+    """Dialogue lines for one stitching part (intro, transition, outro), or [] if generation failed"""
+    key = generation_key(SCRIPT_MODEL, STITCH_PROMPT_VERSION, key_text, part=part)
+    cached = generation_cache.get(key)
+    if cached is not None:
+        return json.loads(cached)
+
+    try:
+        model = genai.GenerativeModel(SCRIPT_MODEL)
+        reply = model.generate_content(prompt).text.strip()
+        reply = reply[reply.find("["): reply.rfind("]") + 1]
+        lines = json.loads(reply)
+        if not isinstance(lines, list) or not all(isinstance(line, str) for line in lines):
+            raise ValueError("Invalid stitch format")
+        generation_cache.set(key, json.dumps(lines).encode("utf-8"))
+        return lines
+    except Exception as e:
+        print(f"Error generating podcast {part}: {e}")
+        return []
+
+
+_STITCH_RULES = """
+Return ONLY a valid JSON array of dialogue line strings, e.g. ["Host: ...", "Guest: ..."].
+Only dialogue lines starting with Host: or Guest:, no stage directions.
+"""
+
+
+def _stitch_intro(sections: List[str]) -> List[str]:
+    """Opening lines, written from the source sections so they are ready before the first section script"""
+    outlines = "\n".join(f"Section {i + 1} begins: {section[:300]!r}" for i, section in enumerate(sections))
+    prompt = f"""
+A long document is being turned into a podcast in {len(sections)} consecutive sections:
+{outlines}
+
+Write the podcast's introduction: 2-4 dialogue lines welcoming listeners and previewing the topics.
+{_STITCH_RULES}"""
+    return _stitch_lines("intro", prompt, outlines)
+
+
+def _stitch_transition(previous: str, following: str) -> List[str]:
+    """A single line bridging two consecutive section scripts"""
+    prompt = f"""
+One part of a podcast ends with: {previous[-300:]!r}
+The next part opens with: {following[:300]!r}
+
+Write exactly 1 dialogue line that transitions smoothly from the first part to the next.
+{_STITCH_RULES}"""
+    return _stitch_lines("transition", prompt, previous[-300:] + following[:300])
+
+
+def _stitch_outro(section_scripts: List[str]) -> List[str]:
+    """Closing lines once every section script is known"""
+    outlines = "\n".join(
+        f"Section {i + 1} opens with: {script[:300]!r} and ends with: {script[-200:]!r}"
+        for i, script in enumerate(section_scripts)
+    )
+    prompt = f"""
+A podcast script was written in {len(section_scripts)} consecutive sections:
+{outlines}
+
+Write the podcast's conclusion: 2-4 dialogue lines with a compelling conclusion and closing remark.
+{_STITCH_RULES}"""
+    return _stitch_lines("outro", prompt, outlines)
+
+
+def _iter_sectioned_script(text: str, failures: Optional[Counter] = None) -> Iterator[str]:
+    """
+    Map-reduce script generation, in script order. Sections are scripted in
+    parallel and each is yielded once it and every earlier one are done. The
+    intro is written alongside them from the source text, each transition on
+    the pool as soon as both of its neighbours exist, and the outro last.
+    Failed sections are left out and counted in failures["sections"]; raises
+    RuntimeError if every section fails.
+    """
+    sections = split_sections(text)
+    total = len(sections)
+    print(f"Generating podcast script in {total} sections (concurrency {SCRIPT_CONCURRENCY})")
+
+    # Submitted first so the intro is ready by the time the first section is
+    intro = _section_pool.submit(_stitch_intro, sections) if total > 1 else None
+    futures = [_section_pool.submit(_generate_section_script, section, i, total) for i, section in enumerate(sections)]
+
+    # Transition futures by boundary (i between sections i and i + 1); None when a neighbour failed
+    transitions = {}
+    transitions_lock = threading.Lock()
+    abandoned = threading.Event()
+
+    def schedule_transitions(_=None):
+        with transitions_lock:
+            if abandoned.is_set():
+                return
+            for i in range(total - 1):
+                before, after = futures[i], futures[i + 1]
+                if i in transitions or not (before.done() and after.done()):
+                    continue
+                if before.cancelled() or after.cancelled() or not (before.result() and after.result()):
+                    transitions[i] = None
+                else:
+                    transitions[i] = _section_pool.submit(_stitch_transition, before.result(), after.result())
+
+    for future in futures:
+        future.add_done_callback(schedule_transitions)
+
+    section_scripts = []
+    previous = None
+    try:
+        for i, future in enumerate(futures):
+            script = future.result()
+            if not script:
+                continue
+            if previous is None:
+                lines = intro.result() if intro is not None else []
+            elif previous == i - 1:
+                # Done callbacks may still be running; scheduling is idempotent
+                schedule_transitions()
+                transition = transitions[i - 1]
+                lines = transition.result() if transition is not None else []
+            else:
+                # The section in between failed, so there is nothing to bridge from
+                lines = []
+            if lines:
+                yield "\n".join(lines)
+            section_scripts.append(script)
+            previous = i
+            yield script
+    finally:
+        with transitions_lock:
+            abandoned.set()
+            pending = [intro, *futures, *transitions.values()]
+        for future in pending:
+            if future is not None:
+                future.cancel()
+
+    if not section_scripts:
+        raise RuntimeError(f"All {total} section(s) failed to generate")
+    if len(section_scripts) < total:
+        print(f"⚠️  {total - len(section_scripts)} of {total} section(s) failed and were left out")
+        if failures is not None:
+            failures["sections"] += total - len(section_scripts)
+    if total > 1:
+        lines = _stitch_outro(section_scripts)
+        if lines:
+            yield "\n".join(lines)
+
+
+def _generate_sectioned_script(text: str) -> Tuple[str, bool]:
+    """The full sectioned script and whether every section made it in; raises RuntimeError if every section fails"""
+    failures = Counter()
+    script = "\n".join(_script_lines("\n".join(_iter_sectioned_script(text, failures))))
+    return script, not failures["sections"]
+
+
 def generate_quiz(text: str, count: int = 5) -> list:
-    """Generate structured quiz questions from text using Gemini."""
+    """Generate structured quiz questions from text using Gemini (cached per input and count)."""
+    # Only the first 3000 characters reach the prompt
+    key = generation_key(QUIZ_MODEL, QUIZ_PROMPT_VERSION, text[:3000], count=count)
+    cached = generation_cache.get(key)
+    if cached is not None:
+        return json.loads(cached)
+
     try:
-        model = genai.GenerativeModel("gemini-2.5-flash")
+        model = genai.GenerativeModel(QUIZ_MODEL)
 
         prompt = f"""
 Create exactly {count} multiple-choice quiz questions based on the following text.  
@@ -85,6 +421,7 @@ Text:
         quiz_data = json.loads(quiz_text)
 
         if isinstance(quiz_data, list) and len(quiz_data) == count:
+            generation_cache.set(key, json.dumps(quiz_data).encode("utf-8"))
             return quiz_data
 
         raise ValueError("Invalid quiz format")
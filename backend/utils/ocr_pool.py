@@ -0,0 +1,143 @@
+import io
+import os
+import math
+import time
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+import pytesseract
+
+try:
+    import tesserocr
+except ImportError:
+    # Without tesserocr each image still costs one tesseract process
+    tesserocr = None
+    print("⚠️  tesserocr is not installed: OCR falls back to one pytesseract process per image")
+
+# Engine that produces OCR text; part of the OCR cache key
+OCR_ENGINE = "tesserocr" if tesserocr is not None else "pytesseract"
+
+# Long-lived OCR worker pool
+# OCR_POOL_SIZE: number of OCR worker processes
+# OCR_BATCH_SIZE: max images sent to a worker per task
+# OCR_IMAGE_TIMEOUT: seconds a single image may spend in tesseract
+# OCR_LANG: tesseract language data loaded once per worker
+OCR_POOL_SIZE = int(os.getenv("OCR_POOL_SIZE", str(os.cpu_count() or 1)))
+OCR_BATCH_SIZE = int(os.getenv("OCR_BATCH_SIZE", "8"))
+OCR_IMAGE_TIMEOUT = float(os.getenv("OCR_IMAGE_TIMEOUT", "30"))
+OCR_LANG = os.getenv("OCR_LANG", "eng")
+
+# POOL_START_METHOD: how worker processes are started. Forking a multithreaded
+# server can copy held locks into the child, so workers come from a forkserver
+POOL_START_METHOD = os.getenv("POOL_START_METHOD", "forkserver")
+
+_pool = None
+
+
+def process_context():
+    """Multiprocessing context for the extraction and OCR pools"""
+    method = POOL_START_METHOD
+    if method not in multiprocessing.get_all_start_methods():
+        method = "spawn"
+    return multiprocessing.get_context(method)
+
+# Per-worker tesseract engine, created once by _init_worker
+_api = None
+
+
+def _init_worker():
+    global _api
+    if tesserocr is not None:
+        _api = tesserocr.PyTessBaseAPI(lang=OCR_LANG)
+
+
+def _ocr_one(image: Image.Image) -> str:
+    if _api is None:
+        return pytesseract.image_to_string(image, lang=OCR_LANG, timeout=OCR_IMAGE_TIMEOUT)
+
+    _api.SetImage(image)
+    if _api.Recognize(timeout=int(OCR_IMAGE_TIMEOUT * 1000)) is False:
+        raise RuntimeError("Tesseract process timeout")
+    return _api.GetUTF8Text()
+
+
+def _ocr_batch(images: list, prepare=None) -> tuple:
+    """
+    Worker task: OCR a batch of (image_bytes, display_inches) pairs.
+    Returns (texts, stats); a text is None when the image failed or timed out,
+    and "" when prepare() rejected it. stats includes prepare_seconds and
+    ocr_seconds spent in this worker.
+    """
+    texts = []
+    stats = Counter()
+
+    for image_bytes, display_inches in images:
+        try:
+            started = time.perf_counter()
+            if prepare is not None:
+                image = prepare(image_bytes, display_inches, stats)
+            else:
+                image = Image.open(io.BytesIO(image_bytes))
+            stats["prepare_seconds"] += time.perf_counter() - started
+            if image is None:
+                texts.append("")
+                continue
+
+            started = time.perf_counter()
+            texts.append(_ocr_one(image))
+            stats["ocr_seconds"] += time.perf_counter() - started
+            stats["images_ocr"] += 1
+        except RuntimeError as e:
+            if "timeout" in str(e).lower():
+                stats["skipped_timeout"] += 1
+            else:
+                stats["skipped_error"] += 1
+            print(f"OCR failed: {e}")
+            texts.append(None)
+        except Exception as e:
+            stats["skipped_error"] += 1
+            print(f"OCR failed: {e}")
+            texts.append(None)
+
+    return texts, stats
+
+
+def get_ocr_pool() -> ProcessPoolExecutor:
+    """Return the shared OCR worker pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=OCR_POOL_SIZE, initializer=_init_worker, mp_context=process_context()
+        )
+    return _pool
+
+
+def submit_images(images: list, prepare=None) -> list:
+    """
+    Queue (image_bytes, display_inches) pairs on the OCR pool.
+    prepare(image_bytes, display_inches, stats) may return a PIL image or None to skip.
+    Returns pending batches to pass to collect_results.
+    """
+    if not images:
+        return []
+
+    # Spread small submissions across all workers rather than one full batch
+    batch_size = max(1, min(OCR_BATCH_SIZE, math.ceil(len(images) / OCR_POOL_SIZE)))
+    pool = get_ocr_pool()
+    return [
+        pool.submit(_ocr_batch, images[i:i + batch_size], prepare)
+        for i in range(0, len(images), batch_size)
+    ]
+
+
+def collect_results(pending: list, stats: Counter = None) -> list:
+    """Wait for submitted batches and return one text per image, in submission order"""
+    texts = []
+    for future in pending:
+        batch_texts, batch_stats = future.result()
+        texts.extend(batch_texts)
+        if stats is not None:
+            stats.update(batch_stats)
+    return texts
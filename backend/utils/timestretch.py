@@ -0,0 +1,60 @@
+"""
+Pitch-preserving time-stretch for MP3 audio using ffmpeg's atempo filter.
+Speed variants are derived from the canonical 1.0x rendering instead of being
+re-synthesized by a provider (StreamElements ignores speed altogether).
+"""
+import os
+import shutil
+import subprocess
+from typing import List
+
+# FFMPEG_BIN: ffmpeg executable; stretching is disabled when it can't be found
+# TIMESTRETCH_BITRATE: bitrate of re-encoded MP3 output
+FFMPEG_BIN = os.getenv("FFMPEG_BIN", "ffmpeg")
+TIMESTRETCH_BITRATE = os.getenv("TIMESTRETCH_BITRATE", "64k")
+TIMESTRETCH_TIMEOUT = int(os.getenv("TIMESTRETCH_TIMEOUT", "120"))
+
+_ffmpeg_path = shutil.which(FFMPEG_BIN)
+
+
+def available() -> bool:
+    return _ffmpeg_path is not None
+
+
+def _atempo_chain(speed: float) -> str:
+    """atempo takes 0.5-2.0 per stage on older ffmpeg builds, so larger changes are chained"""
+    factors: List[float] = []
+    while speed > 2.0:
+        factors.append(2.0)
+        speed /= 2.0
+    while speed < 0.5:
+        factors.append(0.5)
+        speed /= 0.5
+    factors.append(speed)
+    return ",".join(f"atempo={factor:.6f}" for factor in factors)
+
+
+def time_stretch(audio: bytes, speed: float) -> bytes:
+    """Return MP3 audio played back at speed without changing its pitch"""
+    if speed == 1.0:
+        return audio
+    if not available():
+        raise RuntimeError(f"Time-stretch unavailable: {FFMPEG_BIN} not found")
+    if speed <= 0:
+        raise ValueError(f"Invalid speed: {speed}")
+
+    result = subprocess.run(
+        [
+            _ffmpeg_path, "-hide_banner", "-loglevel", "error",
+            "-f", "mp3", "-i", "pipe:0",
+            "-filter:a", _atempo_chain(speed),
+            "-b:a", TIMESTRETCH_BITRATE,
+            "-f", "mp3", "pipe:1",
+        ],
+        input=audio,
+        capture_output=True,
+        timeout=TIMESTRETCH_TIMEOUT,
+    )
+    if result.returncode != 0 or not result.stdout:
+        raise RuntimeError(f"Time-stretch failed: {result.stderr.decode('utf-8', 'replace').strip()}")
+    return result.stdout